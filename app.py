@@ -1,47 +1,143 @@
 
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Response, g, has_request_context, stream_with_context
+import click
+from sqlalchemy import (ForeignKeyConstraint, MetaData, bindparam, case, column, create_engine, delete, event,
+                        insert, inspect, literal_column, or_, select, table, text, tuple_, update)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.sql import func
-from werkzeug.utils import secure_filename
 from flask import send_from_directory
 import os
-from models import Product
+from models import (db, User, Product, ServiceOrder, ContactMessage, ServiceRollup, SentimentRollup, ServiceSlot,
+                    CategoryCount, CatalogMeta, ServiceStat, ProductNeighbor, RecommendationDirty,
+                    CustomerProduct)
+from model_registry import ModelRegistry
+from workers import BatchWorker, Ticket
+from cache import TTLCache
+from faq import KeywordMatcher, normalize_question
+import training
+import db_config
+import images
+import bulk_io
+import recommend
+from metrics import Registry
 import json
-import warnings
-from joblib import load
+import re
+import base64
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+import atexit
+import fcntl
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date as Date, datetime, timedelta
 
 # -------------------------------
-# Load models safely
+# Models: loaded lazily on first use and hot-swapped when a retrained
+# artifact replaces the file (see model_registry.py)
 # -------------------------------
-try:
-    # Ignore version mismatch warnings
-    warnings.filterwarnings("ignore", category=UserWarning)
-
-    vectorizer = load("models/vectorizer.pkl")  # or .joblib if renamed
-    naive_bayes_model = load("models/naive_bayes_model.pkl")
-    faq_model=load("models/faq_model.pkl")
-
-    print("✅ Models loaded successfully")
-except Exception as e:
-    print("❌ Error loading models:", e)
-    vectorizer = None
-    naive_bayes_model = None
+ml_models = ModelRegistry(check_interval=float(os.environ.get("MODEL_CHECK_INTERVAL", 2)))
+ml_models.register("vectorizer", "models/vectorizer.pkl")
+ml_models.register("naive_bayes_model", "models/naive_bayes_model.pkl")
 
 
 # ----------------- APP CONFIG -----------------
 app = Flask(__name__)
 app.secret_key = "your_secret_key"
 
-# --- Two separate databases ---
-app.config['SQLALCHEMY_BINDS'] = {
-    'orders': 'sqlite:///user.db',   # Users + Orders
-    'products': 'sqlite:///products.db', # Products
-    'services': 'sqlite:///services.db',
-    'order': 'sqlite:///order.db'# Products
-}
+# --- Separate databases per bind (URLs, pools and SQLite pragmas in db_config.py) ---
+if db_config.CONSOLIDATED_URL:
+    # One database for every table (the consolidated schema)
+    options = db_config.engine_options(None)
+    app.config['SQLALCHEMY_DATABASE_URI'] = options.pop("url")
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+else:
+    app.config['SQLALCHEMY_BINDS'] = {
+        key: db_config.engine_options(key) for key in db_config.BIND_URLS
+    }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+db.init_app(app)
+
+with app.app_context():
+    for key, engine in db.engines.items():
+        db_config.configure_engine(key, engine)
+
+# ----------------- INSTRUMENTATION -----------------
+# Per-endpoint latency, SQL per request and model inference time, served
+# in Prometheus text format on /metrics. Requests slower than
+# SLOW_REQUEST_MS are logged together with the queries they ran.
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+
+metrics = Registry()
+REQUEST_LATENCY = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ("endpoint", "method"))
+REQUEST_COUNT = metrics.counter(
+    "http_requests_total", "Requests by endpoint and status", ("endpoint", "method", "status"))
+REQUEST_QUERIES = metrics.histogram(
+    "http_request_db_queries", "SQL statements executed per request", ("endpoint",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+QUERY_LATENCY = metrics.histogram(
+    "db_query_duration_seconds", "SQL statement latency by database", ("database",))
+MODEL_LATENCY = metrics.histogram(
+    "model_inference_duration_seconds", "Model inference latency", ("model",))
+
+
+# The start time lives on the per-statement execution context: a failed
+# statement never reaches after_cursor_execute, and anything kept on the
+# pooled connection would outlive it.
+@event.listens_for(Engine, "before_cursor_execute")
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    url = conn.engine.url
+    QUERY_LATENCY.observe(elapsed, database=os.path.basename(url.database or "") or url.host)
+    if has_request_context() and "queries" in g:
+        g.queries.append((statement, elapsed))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.queries = []
+
+
+@app.after_request
+def record_request_metrics(response):
+    if "request_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method)
+    REQUEST_COUNT.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_QUERIES.observe(len(g.queries), endpoint=endpoint)
+
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        app.logger.warning(
+            "Slow request %s %s: %.1f ms, %d queries\n%s",
+            request.method, request.full_path, elapsed * 1000, len(g.queries),
+            "\n".join(f"  {ms * 1000:7.1f} ms  {sql}" for sql, ms in g.queries)
+        )
+    return response
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 
 # --- Upload config ---
 UPLOAD_FOLDER = os.path.join("static", "uploads")
@@ -52,63 +148,732 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# ----------------- DATABASE MODELS -----------------
-class User(db.Model):
-    __bind_key__ = 'orders'
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-
-
-class Product(db.Model):
-    __bind_key__ = 'products'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    description = db.Column(db.String(200))
-    image = db.Column(db.String(200))
-    price_range = db.Column(db.String(50))
-
-
-class ServiceOrder(db.Model):
-    __bind_key__ = 'services'   # separate DB or can remove if you want same db
-    id = db.Column(db.Integer, primary_key=True)
-
-    # User/service details
-    name = db.Column(db.String(100), nullable=False)
-    phone = db.Column(db.String(20), nullable=False)
-    service_type = db.Column(db.String(100), nullable=False)
-    date = db.Column(db.String(50), nullable=False)
-    address = db.Column(db.String(200), nullable=False)
-
-    # Product details (copied from products.db at install time)
-    product_name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
-
-class ContactMessage(db.Model):
-    __bind_key__ = "order"   # storing in user.db
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(120), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    sentiment = db.Column(db.String(20), nullable=False)  # positive/negative/neutral
+
+def bind_connection(model):
+    """The session's connection to the database `model` lives in (joins its transaction)."""
+    return db.session.connection(bind_arguments={"bind": db.engines[model.__bind_key__]})
+
+# ----------------- DASHBOARD COUNTERS -----------------
+# Counters are updated on the flush connection, so they commit or roll
+# back together with the insert/delete itself.
+def bump_category(connection, category, delta):
+    table = CategoryCount.__table__
+    result = connection.execute(
+        update(table).where(table.c.category == category).values(count=table.c.count + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(category=category, count=delta))
+
+
+def bump_catalog_version(connection):
+    # Any product write invalidates the cached catalog responses (see catalog_cached)
+    table = CatalogMeta.__table__
+    result = connection.execute(
+        update(table).where(table.c.key == "version").values(value=table.c.value + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(key="version", value=1))
+
+
+def bump_service_stats(connection, orders, revenue):
+    table = ServiceStat.__table__
+    for key, delta in (("orders", orders), ("revenue", revenue)):
+        result = connection.execute(
+            update(table).where(table.c.key == key).values(value=table.c.value + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(key=key, value=delta))
+
+
+@event.listens_for(Product, "after_insert")
+def product_inserted(mapper, connection, target):
+    bump_category(connection, target.category, 1)
+    bump_catalog_version(connection)
+
+
+def mark_recommendations_dirty(connection, product_id):
+    # Picked up by the next refresh_recommendations()
+    table = RecommendationDirty.__table__
+    if connection.execute(select(table.c.product_id).where(table.c.product_id == product_id)).first() is None:
+        connection.execute(insert(table).values(product_id=product_id))
+
+
+@event.listens_for(Product, "after_delete")
+def product_deleted(mapper, connection, target):
+    bump_category(connection, target.category, -1)
+    bump_catalog_version(connection)
+    mark_recommendations_dirty(connection, target.id)
+
+
+@event.listens_for(Product, "after_update")
+def product_updated(mapper, connection, target):
+    bump_catalog_version(connection)
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("name", "category", "description")):
+        mark_recommendations_dirty(connection, target.id)
+    history = inspect(target).attrs.category.history
+    if history.has_changes() and history.deleted:
+        bump_category(connection, history.deleted[0], -1)
+        bump_category(connection, target.category, 1)
+
+
+@event.listens_for(ServiceOrder, "after_insert")
+def service_inserted(mapper, connection, target):
+    bump_service_stats(connection, 1, float(target.price or 0))
+
+
+@event.listens_for(ServiceOrder, "after_delete")
+def service_deleted(mapper, connection, target):
+    bump_service_stats(connection, -1, -float(target.price or 0))
+    if target.service_date is not None:
+        release_slot(connection, target.service_date, target.service_type)
+
+
+@event.listens_for(ServiceOrder, "after_delete")
+def service_unrolled(mapper, connection, target):
+    # Orders already folded into the rollups have to be taken back out
+    stats = ServiceStat.__table__
+    watermark = connection.execute(
+        stats.select().with_only_columns(stats.c.value).where(stats.c.key == ROLLUP_WATERMARK)
+    ).scalar() or 0
+    if target.id > watermark or target.service_date is None:
+        return
+    rollups = ServiceRollup.__table__
+    for period in ROLLUP_PERIODS:
+        connection.execute(
+            update(rollups)
+            .where(rollups.c.period == period,
+                   rollups.c.bucket == bucket_start(target.service_date, period),
+                   rollups.c.service_type == target.service_type,
+                   rollups.c.product_name == target.product_name)
+            .values(orders=rollups.c.orders - 1,
+                    revenue=rollups.c.revenue - float(target.price or 0))
+        )
+
+
+@event.listens_for(ServiceOrder, "after_update")
+def service_updated(mapper, connection, target):
+    history = inspect(target).attrs.price.history
+    if history.has_changes() and history.deleted:
+        bump_service_stats(connection, 0, float(target.price or 0) - float(history.deleted[0] or 0))
+
+
+# ----------------- SERVICE ANALYTICS -----------------
+ROLLUP_PERIODS = ("day", "week", "month")
+ROLLUP_WATERMARK = "rollup_last_id"   # ServiceStat key: highest rolled-up ServiceOrder.id
+SERVICE_DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d", "%d %B %Y", "%d %b %Y")
+
+_rollup_lock = threading.Lock()
+
+
+def parse_service_date(value):
+    value = (value or "").strip()
+    for fmt in SERVICE_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def bucket_start(day, period):
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def refresh_service_rollups(batch_size=1000):
+    """Fold ServiceOrder rows above the watermark into ServiceRollup.
+
+    Each batch claims its id range with a conditional update of the
+    watermark, so concurrent refreshes (other threads or workers) can never
+    count the same orders twice.
+    """
+    stats = ServiceStat.__table__
+    processed = 0
+    with _rollup_lock:
+        while True:
+            watermark = db.session.get(ServiceStat, ROLLUP_WATERMARK)
+            last_id = int(watermark.value) if watermark else 0
+            rows = (ServiceOrder.query.filter(ServiceOrder.id > last_id)
+                    .order_by(ServiceOrder.id).limit(batch_size).all())
+            if not rows:
+                db.session.rollback()
+                return processed
+
+            if watermark is None:
+                db.session.add(ServiceStat(key=ROLLUP_WATERMARK, value=0))
+                db.session.flush()
+            claimed = db.session.execute(
+                update(stats)
+                .where(stats.c.key == ROLLUP_WATERMARK, stats.c.value == last_id)
+                .values(value=rows[-1].id)
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                continue
+
+            deltas = defaultdict(lambda: [0, 0.0])
+            for order in rows:
+                if order.service_date is None:
+                    order.service_date = parse_service_date(order.date)
+                if order.service_date is None:
+                    continue   # free-text date we cannot bucket
+                for period in ROLLUP_PERIODS:
+                    key = (period, bucket_start(order.service_date, period),
+                           order.service_type, order.product_name)
+                    deltas[key][0] += 1
+                    deltas[key][1] += float(order.price or 0)
+
+            for (period, bucket, service_type, product_name), (orders, revenue) in deltas.items():
+                rollup = ServiceRollup.query.filter_by(
+                    period=period, bucket=bucket,
+                    service_type=service_type, product_name=product_name
+                ).first()
+                if rollup is None:
+                    db.session.add(ServiceRollup(
+                        period=period, bucket=bucket, service_type=service_type,
+                        product_name=product_name, orders=orders, revenue=revenue
+                    ))
+                else:
+                    rollup.orders += orders
+                    rollup.revenue += revenue
+            db.session.commit()
+            processed += len(rows)
+
+
+@app.cli.command("refresh-rollups")
+@click.option("--batch-size", default=1000, show_default=True)
+def refresh_rollups_command(batch_size):
+    """Roll new service orders up into the analytics tables."""
+    processed = refresh_service_rollups(batch_size)
+    click.echo(f"Rolled up {processed} service orders")
+
+
+def roll_up_new_orders():
+    """Fold just-booked orders into the rollups on the write path.
+
+    A failure only delays them until the next booking or `flask refresh-rollups`.
+    """
+    try:
+        refresh_service_rollups()
+    except Exception as e:
+        db.session.rollback()
+        print("❌ Service rollup refresh failed:", e)
+
+
+# ---------- RECOMMENDATIONS ----------
+# "Similar products" and "often serviced together" neighbours are computed
+# offline (recommend.py) into ProductNeighbor. A refresh only recomputes the
+# products whose inputs changed: new products (id above the watermark),
+# edited or deleted ones (RecommendationDirty), products that listed one of
+# those, products a new/edited product now outranks, and everything
+# serviced alongside a product that gained orders. Customer baskets are kept
+# in CustomerProduct and only orders above the order watermark are read;
+# deleting an order takes its pair back out (service_unrecommended) and
+# marks that customer's products dirty. The catalog is re-vectorized only
+# when a product changed (IDF weights are global). Unchanged rows keep the
+# TF-IDF weights of their last computation; --full re-weights everything
+# and rebuilds the baskets.
+RECOMMENDATIONS_K = int(os.environ.get("RECOMMENDATIONS_K", 8))
+RECS_PRODUCT_WATERMARK = "recs_last_product_id"   # CatalogMeta key
+RECS_ORDER_WATERMARK = "recs_last_order_id"       # ServiceStat key
+RECS_KINDS = ("similar", "together")
+
+_recs_lock = threading.Lock()
+
+
+def _meta_value(model, key):
+    row = db.session.get(model, key)
+    return int(row.value) if row else 0
+
+
+def _set_meta_value(model, key, value):
+    row = db.session.get(model, key)
+    if row is None:
+        db.session.add(model(key=key, value=value))
+    else:
+        row.value = value
+
+
+def _listing(kind, neighbor_ids):
+    """Products whose stored `kind` list contains any of neighbor_ids."""
+    found = set()
+    for chunk in bulk_io.chunked(neighbor_ids, 500):
+        found.update(pid for (pid,) in db.session.query(ProductNeighbor.product_id).distinct()
+                     .filter(ProductNeighbor.kind == kind, ProductNeighbor.neighbor_id.in_(chunk)))
+    return found
+
+
+def _replace_neighbors(kind, targets, neighbors):
+    table = ProductNeighbor.__table__
+    connection = bind_connection(ProductNeighbor)
+    for chunk in bulk_io.chunked(sorted(targets), 500):
+        connection.execute(delete(table).where(table.c.kind == kind, table.c.product_id.in_(chunk)))
+    rows = [
+        {"product_id": pid, "kind": kind, "rank": rank, "neighbor_id": nid, "score": score}
+        for pid, pairs in neighbors.items()
+        for rank, (nid, score) in enumerate(pairs)
+    ]
+    for chunk in bulk_io.chunked(rows, IMPORT_CHUNK_SIZE):
+        connection.execute(insert(table), chunk)
+
+
+def _order_products(orders, existing):
+    """Distinct (customer, product_id) pairs for (phone, name, product_id, product_name) orders."""
+    orders = list(orders)
+    # Orders from before product_id was recorded are matched by name (lowest id wins)
+    names = sorted({product_name for _, _, pid, product_name in orders if pid not in existing and product_name})
+    by_name = {}
+    for chunk in bulk_io.chunked(names, 500):
+        by_name.update((name, pid) for name, pid in db.session.query(Product.name, func.min(Product.id))
+                       .filter(Product.name.in_(chunk)).group_by(Product.name))
+    pairs = set()
+    for phone, name, product_id, product_name in orders:
+        pid = product_id if product_id in existing else by_name.get(product_name)
+        customer = recommend.customer_key(phone, name)
+        if customer and pid is not None:
+            pairs.add((customer, pid))
+    return pairs
+
+
+def _add_customer_products(pairs):
+    table = CustomerProduct.__table__
+    connection = bind_connection(CustomerProduct)
+    for chunk in bulk_io.chunked(sorted(pairs), 500):
+        known = set(connection.execute(select(table.c.customer, table.c.product_id)
+                                       .where(table.c.customer.in_({c for c, _ in chunk}))))
+        rows = [{"customer": c, "product_id": pid} for c, pid in chunk if (c, pid) not in known]
+        if rows:
+            connection.execute(insert(table), rows)
+
+
+def _baskets(customers):
+    baskets = defaultdict(set)
+    for chunk in bulk_io.chunked(sorted(customers), 500):
+        for customer, pid in db.session.query(CustomerProduct.customer, CustomerProduct.product_id) \
+                .filter(CustomerProduct.customer.in_(chunk)):
+            baskets[customer].add(pid)
+    return baskets
+
+
+def _customers_of(product_ids):
+    customers = set()
+    for chunk in bulk_io.chunked(sorted(product_ids), 500):
+        customers.update(c for (c,) in db.session.query(CustomerProduct.customer).distinct()
+                         .filter(CustomerProduct.product_id.in_(chunk)))
+    return customers
+
+
+def _customer_counts(product_ids):
+    counts = {}
+    for chunk in bulk_io.chunked(sorted(product_ids), 500):
+        counts.update(db.session.query(CustomerProduct.product_id, func.count())
+                      .filter(CustomerProduct.product_id.in_(chunk)).group_by(CustomerProduct.product_id))
+    return counts
+
+
+def _product_matrix():
+    products = (db.session.query(Product.id, Product.name, Product.category, Product.description)
+                .order_by(Product.id).all())
+    return [p.id for p in products], recommend.product_vectors(
+        [recommend.product_text(p.name, p.category, p.description) for p in products])
+
+
+def refresh_recommendations(full=False, k=None):
+    """Recompute the neighbour rows whose inputs changed; returns {kind: products refreshed}."""
+    k = k or RECOMMENDATIONS_K
+    with _recs_lock:
+        ids = [pid for (pid,) in db.session.query(Product.id).order_by(Product.id)]
+        existing = set(ids)
+        dirty = {pid for (pid,) in db.session.query(RecommendationDirty.product_id)}
+        last_product = _meta_value(CatalogMeta, RECS_PRODUCT_WATERMARK)
+        last_order = _meta_value(ServiceStat, RECS_ORDER_WATERMARK)
+        if last_order and db.session.query(CustomerProduct.customer).first() is None:
+            full = True     # baskets table new since the last refresh
+        orders = db.session.query(ServiceOrder.phone, ServiceOrder.name,
+                                  ServiceOrder.product_id, ServiceOrder.product_name)
+        max_order = db.session.query(func.max(ServiceOrder.id)).scalar() or 0
+
+        if full:
+            targets = {kind: set(ids) for kind in RECS_KINDS}
+            removed = {pid for (pid,) in db.session.query(ProductNeighbor.product_id).distinct()} - existing
+            db.session.query(CustomerProduct).delete()
+            pairs = _order_products(orders.filter(ServiceOrder.id <= max_order)
+                                    .yield_per(IMPORT_CHUNK_SIZE), existing)
+            _add_customer_products(pairs)
+            baskets, counts = defaultdict(set), None
+            for customer, pid in pairs:
+                baskets[customer].add(pid)
+            matrix_ids, matrix = _product_matrix()
+        else:
+            changed = {pid for pid in ids if pid > last_product} | (dirty & existing)
+            removed = dirty - existing
+            targets = {kind: changed | _listing(kind, changed | removed) for kind in RECS_KINDS}
+
+            matrix_ids, matrix = _product_matrix() if changed or removed else (ids, None)
+            if changed:
+                # Products a changed product would now enter the top k of
+                kth = {pid: (count, low) for pid, count, low in db.session.query(
+                    ProductNeighbor.product_id, func.count(), func.min(ProductNeighbor.score)
+                ).filter(ProductNeighbor.kind == "similar").group_by(ProductNeighbor.product_id)}
+                for pid, sim in recommend.similarity_to(matrix_ids, matrix, changed).items():
+                    count, low = kth.get(pid, (0, 0.0))
+                    if sim > 0 and (count < k or sim > low):
+                        targets["similar"].add(pid)
+
+            # A new order (or a deleted product) changes the scores of every
+            # pair involving its product, i.e. everything serviced by that
+            # product's customers
+            pairs = _order_products(orders.filter(ServiceOrder.id > last_order,
+                                                  ServiceOrder.id <= max_order), existing)
+            # Dirty products include those that lost a customer to a deleted order
+            affected = {customer for customer, _ in pairs} | _customers_of(removed | (dirty & existing))
+            for chunk in bulk_io.chunked(sorted(removed), 500):
+                CustomerProduct.query.filter(CustomerProduct.product_id.in_(chunk)).delete()
+            _add_customer_products(pairs)
+            touched = set().union(*_baskets(affected).values())
+            targets["together"].update(set().union(*_baskets(_customers_of(touched)).values()))
+            targets["together"] &= existing
+
+            baskets = _baskets(_customers_of(targets["together"]))
+            counts = _customer_counts(set().union(*baskets.values()))
+
+        _replace_neighbors("similar", targets["similar"] | removed,
+                           recommend.similar_products(matrix_ids, matrix, sorted(targets["similar"]), k))
+        _replace_neighbors("together", targets["together"] | removed,
+                           recommend.serviced_together(baskets, sorted(targets["together"]), k, counts))
+
+        if ids:
+            _set_meta_value(CatalogMeta, RECS_PRODUCT_WATERMARK, max(last_product, ids[-1]))
+        _set_meta_value(ServiceStat, RECS_ORDER_WATERMARK, max(last_order, max_order))
+        for chunk in bulk_io.chunked(sorted(dirty), 500):
+            RecommendationDirty.query.filter(RecommendationDirty.product_id.in_(chunk)).delete()
+        # Cached /recommendations responses are keyed on the catalog version
+        bump_catalog_version(bind_connection(Product))
+        db.session.commit()
+        return {kind: len(targets[kind]) for kind in RECS_KINDS}
+
+
+def _order_product_id(products_conn, product_id, product_name):
+    """The product an order counts for, matched the way _order_products does."""
+    products = Product.__table__
+    if product_id is not None and products_conn.execute(
+            select(products.c.id).where(products.c.id == product_id)).first() is not None:
+        return product_id
+    if not product_name:
+        return None
+    return products_conn.execute(select(func.min(products.c.id)).where(products.c.name == product_name)).scalar()
+
+
+@event.listens_for(ServiceOrder, "after_delete")
+def service_unrecommended(mapper, connection, target):
+    # Orders already folded into CustomerProduct have to be taken back out
+    stats = ServiceStat.__table__
+    watermark = connection.execute(
+        select(stats.c.value).where(stats.c.key == RECS_ORDER_WATERMARK)
+    ).scalar() or 0
+    customer = recommend.customer_key(target.phone, target.name)
+    if target.id > watermark or not customer:
+        return
+    products_conn = bind_connection(Product)
+    pid = _order_product_id(products_conn, target.product_id, target.product_name)
+    if pid is None:
+        return
+
+    # The pair stays while the customer has another order for the product
+    orders = ServiceOrder.__table__
+    same_customer = (func.trim(orders.c.phone) == customer) | (func.lower(func.trim(orders.c.name)) == customer)
+    for phone, name, product_id, product_name in connection.execute(
+            select(orders.c.phone, orders.c.name, orders.c.product_id, orders.c.product_name)
+            .where(same_customer, orders.c.id <= watermark)):
+        if (recommend.customer_key(phone, name) == customer
+                and _order_product_id(products_conn, product_id, product_name) == pid):
+            return
+
+    baskets = CustomerProduct.__table__
+    basket = [p for (p,) in connection.execute(select(baskets.c.product_id).where(baskets.c.customer == customer))]
+    connection.execute(delete(baskets).where(baskets.c.customer == customer, baskets.c.product_id == pid))
+    for product_id in {pid, *basket}:
+        mark_recommendations_dirty(products_conn, product_id)
+
+
+@app.cli.command("refresh-recommendations")
+@click.option("--full", is_flag=True, help="Recompute every product and rebuild the customer baskets.")
+@click.option("-k", "--neighbors", type=int, default=None, help="Neighbours kept per product.")
+def refresh_recommendations_command(full, neighbors):
+    """Update the similar / serviced-together recommendation table."""
+    started = time.perf_counter()
+    refreshed = refresh_recommendations(full, neighbors)
+    click.echo(f"Refreshed {refreshed['similar']} similar and {refreshed['together']} "
+               f"serviced-together lists in {time.perf_counter() - started:.1f}s")
+
+
+def product_recommendations(product_id, uploads_url=None):
+    rows = (ProductNeighbor.query.filter_by(product_id=product_id)
+            .order_by(ProductNeighbor.kind, ProductNeighbor.rank).all())
+    neighbors = {p.id: p for p in Product.query.filter(Product.id.in_({r.neighbor_id for r in rows}))} if rows else {}
+    result = {kind: [] for kind in RECS_KINDS}
+    for row in rows:
+        product = neighbors.get(row.neighbor_id)
+        if product is not None:   # deleted since the last refresh
+            result[row.kind].append({**product_to_dict(product, uploads_url), "score": row.score})
+    return result
+
+
+def seed_dashboard_counters():
+    # One-off backfill for databases that predate the counter tables
+    try:
+        if CategoryCount.query.first() is None:
+            for category, count in db.session.query(
+                Product.category, func.count(Product.id)
+            ).group_by(Product.category):
+                db.session.add(CategoryCount(category=category, count=count))
+        if db.session.get(ServiceStat, "orders") is None:
+            orders, revenue = db.session.query(
+                func.count(ServiceOrder.id), func.coalesce(func.sum(ServiceOrder.price), 0)
+            ).one()
+            db.session.add(ServiceStat(key="orders", value=orders))
+            db.session.add(ServiceStat(key="revenue", value=revenue))
+        db.session.commit()
+    except IntegrityError:
+        # Another worker seeded the counters first
+        db.session.rollback()
+
 
 # ----------------- CREATE DATABASE -----------------
+def upgrade_schema(model):
+    # create_all() never touches tables that already exist, so add the
+    # columns and indexes introduced after the database file was created
+    engine = db.engines[model.__bind_key__]
+    table = model.__table__
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for col in table.columns:
+            if col.name not in existing:
+                conn.execute(text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"
+                ))
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
 with app.app_context():
-    db.create_all(bind_key="orders")
-    db.create_all(bind_key="products")
-    db.create_all(bind_key="services")
-    db.create_all(bind_key="order")
+    db.create_all(bind_key=list(db.engines))
+
+    upgrade_schema(Product)
+    upgrade_schema(ServiceOrder)
+    upgrade_schema(ContactMessage)
+
+    seed_dashboard_counters()
+
+
+# ----------------- SCHEMA CONSOLIDATION -----------------
+# Id references that become real foreign keys in the single-database schema
+CONSOLIDATED_REFERENCES = {
+    ("service_order", "product_id"): "product.id",
+    ("service_order", "user_id"): "user.id",
+}
+
+
+def consolidated_metadata():
+    """Every mapped table, copied into one MetaData with the foreign keys added."""
+    metadata = MetaData()
+    for mapper in db.Model.registry.mappers:
+        mapper.local_table.to_metadata(metadata)
+    for (table_name, column_name), target in CONSOLIDATED_REFERENCES.items():
+        metadata.tables[table_name].append_constraint(
+            ForeignKeyConstraint([column_name], [target], ondelete="SET NULL")
+        )
+    return metadata
+
+
+def consolidate_into(target_url, chunk_size=1000, echo=print):
+    """Copy all four bind databases into one database with the consolidated schema."""
+    target = create_engine(target_url)
+    metadata = consolidated_metadata()
+    sources = {m.local_table.name: m.class_ for m in db.Model.registry.mappers}
+
+    with target.connect() as conn:
+        existing = set(inspect(conn).get_table_names())
+        for table_name in existing & set(metadata.tables):
+            if conn.execute(select(func.count()).select_from(metadata.tables[table_name])).scalar():
+                raise click.ClickException(f"Target table '{table_name}' is not empty")
+    metadata.create_all(target)
+
+    copied_ids = {}
+    for target_table in metadata.sorted_tables:
+        model = sources[target_table.name]
+        source = db.engines[model.__bind_key__]
+        ids, count = set(), 0
+        with source.connect() as src, target.begin() as dst:
+            result = src.execution_options(yield_per=chunk_size).execute(select(model.__table__))
+            for chunk in result.partitions():
+                rows = [dict(row._mapping) for row in chunk]
+                for row in rows:
+                    # Dangling references (e.g. a deleted product) would violate the new keys
+                    for (table_name, column_name), ref in CONSOLIDATED_REFERENCES.items():
+                        if table_name == target_table.name and row[column_name] not in copied_ids.get(ref.split(".")[0], ()):
+                            row[column_name] = None
+                    if "id" in row:
+                        ids.add(row["id"])
+                dst.execute(insert(target_table), rows)
+                count += len(rows)
+        copied_ids[target_table.name] = ids
+        echo(f"{target_table.name}: {count} rows")
+
+    # Link orders saved before the id columns existed by name
+    orders, products, users = (metadata.tables[n] for n in ("service_order", "product", "user"))
+    with target.begin() as dst:
+        dst.execute(update(orders).where(orders.c.product_id.is_(None)).values(
+            product_id=select(func.min(products.c.id))
+            .where(products.c.name == orders.c.product_name).scalar_subquery()
+        ))
+        dst.execute(update(orders).where(orders.c.user_id.is_(None)).values(
+            user_id=select(func.min(users.c.id))
+            .where(users.c.username == orders.c.name).scalar_subquery()
+        ))
+        if target.dialect.name == "postgresql":
+            # Explicit ids were inserted, so move the serial sequences past them
+            for t in metadata.sorted_tables:
+                if "id" in t.c and t.c.id.primary_key:
+                    dst.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('\"{t.name}\"', 'id'), "
+                        f"COALESCE(MAX(id), 1)) FROM \"{t.name}\""
+                    ))
+    target.dispose()
+
+
+@app.cli.command("consolidate-db")
+@click.argument("target_url")
+@click.option("--chunk-size", default=1000, show_default=True)
+def consolidate_db_command(target_url, chunk_size):
+    """Migrate the four bind databases into TARGET_URL (then run with DATABASE_URL=TARGET_URL)."""
+    if db_config.CONSOLIDATED_URL:
+        raise click.ClickException("Already running on the consolidated schema")
+    consolidate_into(target_url, chunk_size, echo=click.echo)
+    click.echo(f"Done. Start the app with DATABASE_URL={target_url}")
+
+
+# ----------------- FULL-TEXT SEARCH -----------------
+# External-content FTS5 index over product name/category/description.
+# Triggers keep it in sync with every insert, update and delete on the
+# product table, whichever code path performs the write.
+PRODUCT_FTS_DDL = [
+    """CREATE VIRTUAL TABLE product_fts USING fts5(
+        name, category, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, category, description)
+        VALUES (new.id, new.name, new.category, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, category, description)
+        VALUES ('delete', old.id, old.name, old.category, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, category, description)
+        VALUES ('delete', old.id, old.name, old.category, old.description);
+        INSERT INTO product_fts(rowid, name, category, description)
+        VALUES (new.id, new.name, new.category, new.description);
+    END""",
+]
+
+
+def setup_product_fts():
+    engine = db.engines[Product.__bind_key__]
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+            )).first()
+            if not exists:
+                conn.execute(text(PRODUCT_FTS_DDL[0]))
+            for ddl in PRODUCT_FTS_DDL[1:]:
+                conn.execute(text(ddl))
+            if not exists:
+                # Index the products that were added before the FTS table existed
+                conn.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+        return True
+    except OperationalError as e:
+        # SQLite builds without FTS5 fall back to LIKE matching
+        print("❌ Full-text search unavailable:", e)
+        return False
+
+
+with app.app_context():
+    FTS_ENABLED = setup_product_fts()
+
+# ---------- HTTP CACHING ----------
+# Serialized catalog responses, keyed by catalog version + request
+catalog_cache = TTLCache(maxsize=int(os.environ.get("CATALOG_CACHE_SIZE", 512)))
+# Rendered static pages, keyed by template + the session fields they show
+page_cache = TTLCache(maxsize=64)
+
+
+def catalog_version():
+    meta = db.session.get(CatalogMeta, "version")
+    return meta.value if meta else 0
+
+
+def catalog_cached(view):
+    """ETag/304 + server-side caching for read-only catalog JSON endpoints.
+
+    The ETag is derived from the catalog version and the request itself, so
+    a conditional GET is answered after a single primary-key lookup; the
+    body is only rebuilt after add/update/delete bumps the version.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = catalog_version()
+        # Re-encoded, so an escaped "&" or "=" inside a value cannot alias another query
+        query = urlencode(sorted(request.args.items(multi=True)))
+        key = f"{request.path}?{query}"
+        etag = hashlib.sha1(f"{version}:{key}".encode()).hexdigest()[:24]
+
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            body = catalog_cache.get((version, key))
+            if body is not None:
+                response = app.response_class(body, mimetype="application/json")
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                catalog_cache.set((version, key), response.get_data())
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "public, no-cache"
+        return response
+    return wrapper
+
+
+def render_cached_page(template):
+    key = (template, session.get("logged_in"), session.get("is_admin"), session.get("user_name"))
+    body = page_cache.get(key)
+    if body is None:
+        body = render_template(template)
+        page_cache.set(key, body)
+
+    response = app.make_response(body)
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest()[:24])
+    response.headers["Cache-Control"] = "private, no-cache" if session.get("logged_in") else "public, no-cache"
+    return response.make_conditional(request)
+
 
 @app.route("/index")
 def index():
-    return render_template("index.html")
+    return render_cached_page("index.html")
 # ---------- HOME ----------
 @app.route("/")
 def home():
-    return render_template("index.html")
+    return render_cached_page("index.html")
 
 # ---------- AUTH ----------
 @app.route("/login", methods=["GET", "POST"])
@@ -131,6 +896,7 @@ def login():
             session["logged_in"] = True
             session["is_admin"] = False
             session["user_name"]=user.username
+            session["user_id"] = user.id
             return redirect(next_page or url_for("products"))
 
         return render_template("login.html", error="❌ Invalid username or password! Please check again or register first.")
@@ -182,31 +948,50 @@ def logout():
     return redirect(url_for("index"))
 
 
-# ---------- ADMIN DASHBOARD ----------
-@app.route("/admin")
-def admin_dashboard():
-    # Total products
-    total_products = Product.query.count()
+def admin_required(view):
+    """Reject non-admin sessions with a JSON 403 (bulk data endpoints)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not session.get("is_admin"):
+            return jsonify({"error": "Admin login required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
 
-    # Categories
-    categories = db.session.query(
-        Product.category, func.count(Product.id)
-    ).group_by(Product.category).all()
 
-    # Fetch services
-    services = ServiceOrder.query.order_by(ServiceOrder.id.desc()).all()
+# ---------- ADMIN DASHBOARD ----------
+ADMIN_SERVICES_PER_PAGE = 25
 
-    # Total Orders = last service ID (or 0 if no services yet)
-    last_service = ServiceOrder.query.order_by(ServiceOrder.id.desc()).first()
-    total_orders = ServiceOrder.query.count()
-    # Total Revenue = sum of all prices
-    total_revenue = db.session.query(func.sum(ServiceOrder.price)).scalar() or 0
+
+@app.route("/admin")
+def admin_dashboard():
+    # Product totals come from the running per-category counters
+    categories = [
+        (c.category, c.count)
+        for c in CategoryCount.query.filter(CategoryCount.count > 0).order_by(CategoryCount.category)
+    ]
+    total_products = sum(count for _, count in categories)
+
+    # Total Orders / Total Revenue are maintained on insert and delete
+    stats = {s.key: s.value for s in ServiceStat.query.all()}
+    total_orders = int(stats.get("orders", 0))
+    total_revenue = stats.get("revenue", 0)
+
+    # Fetch one page of services, newest first (keyset on id)
+    before = request.args.get("before", type=int)
+    query = ServiceOrder.query
+    if before:
+        query = query.filter(ServiceOrder.id < before)
+    rows = query.order_by(ServiceOrder.id.desc()).limit(ADMIN_SERVICES_PER_PAGE + 1).all()
+    services = rows[:ADMIN_SERVICES_PER_PAGE]
+    next_before = services[-1].id if len(rows) > ADMIN_SERVICES_PER_PAGE else None
 
     return render_template(
         "admin.html",
         total_products=total_products,
         categories=categories,
         services=services,
+        next_before=next_before,
+        is_first_page=before is None,
         total_orders=total_orders,
         total_revenue=total_revenue
     )
@@ -222,6 +1007,114 @@ def delete_service(service_id):
     flash("Service deleted successfully!", "success")
     return redirect(url_for("admin_dashboard"))
 
+
+# ---------- SERVICE ANALYTICS API ----------
+@app.route("/api/analytics/services")
+@admin_required
+def api_service_analytics():
+    args = request.args
+    period = args.get("period", "day")
+    group_by = args.get("group_by", "service_type")
+    if period not in ROLLUP_PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(ROLLUP_PERIODS)}"}), 400
+    if group_by not in ("service_type", "product_name", "none"):
+        return jsonify({"error": "group_by must be service_type, product_name or none"}), 400
+
+    try:
+        end = Date.fromisoformat(args["end"]) if args.get("end") else Date.today()
+        start = Date.fromisoformat(args["start"]) if args.get("start") else end - timedelta(days=30)
+    except ValueError:
+        return jsonify({"error": "start/end must be YYYY-MM-DD"}), 400
+
+    # Read-only: bookings fold themselves into the rollups (roll_up_new_orders)
+    group_col = getattr(ServiceRollup, group_by, None)
+    columns = [ServiceRollup.bucket] + ([group_col] if group_col is not None else [])
+    rows = (db.session.query(*columns,
+                             func.sum(ServiceRollup.orders),
+                             func.sum(ServiceRollup.revenue))
+            .filter(ServiceRollup.period == period,
+                    ServiceRollup.bucket >= bucket_start(start, period),
+                    ServiceRollup.bucket <= end)
+            .group_by(*columns)
+            .order_by(*columns)
+            .all())
+
+    series = []
+    for row in rows:
+        point = {"bucket": row[0].isoformat(), "orders": int(row[-2]), "revenue": round(row[-1], 2)}
+        if group_col is not None:
+            point[group_by] = row[1]
+        series.append(point)
+
+    return jsonify({
+        "period": period,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "series": series,
+        "totals": {
+            "orders": sum(p["orders"] for p in series),
+            "revenue": round(sum(p["revenue"] for p in series), 2)
+        }
+    })
+
+
+# ---------- SERVICE / MESSAGE EXPORTS ----------
+SERVICE_EXPORT_COLUMNS = ("id", "name", "phone", "service_type", "date", "service_date",
+                          "address", "product_name", "price")
+MESSAGE_EXPORT_COLUMNS = ("id", "name", "email", "message", "sentiment", "sentiment_score", "label", "created_at")
+
+
+@app.route("/admin/export/services")
+@admin_required
+def export_services():
+    args = request.args
+    fmt = bulk_io.resolve_format(args.get("format", "csv"))
+    if fmt is None:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    filters = []
+    try:
+        if args.get("start"):
+            filters.append(ServiceOrder.service_date >= Date.fromisoformat(args["start"]))
+        if args.get("end"):
+            filters.append(ServiceOrder.service_date <= Date.fromisoformat(args["end"]))
+    except ValueError:
+        return jsonify({"error": "start/end must be YYYY-MM-DD"}), 400
+    if args.get("service_type"):
+        filters.append(ServiceOrder.service_type == args["service_type"])
+
+    return streaming_download(stream_rows(ServiceOrder, SERVICE_EXPORT_COLUMNS, fmt, filters),
+                              fmt, "service_orders")
+
+
+@app.route("/admin/export/messages")
+@admin_required
+def export_messages():
+    args = request.args
+    fmt = bulk_io.resolve_format(args.get("format", "csv"))
+    if fmt is None:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    # Whole days: end is inclusive. Legacy rows without created_at only
+    # appear in exports with no date range.
+    filters = []
+    try:
+        if args.get("start"):
+            filters.append(ContactMessage.created_at >= datetime.combine(Date.fromisoformat(args["start"]),
+                                                                         datetime.min.time()))
+        if args.get("end"):
+            filters.append(ContactMessage.created_at < datetime.combine(Date.fromisoformat(args["end"]),
+                                                                        datetime.min.time()) + timedelta(days=1))
+    except ValueError:
+        return jsonify({"error": "start/end must be YYYY-MM-DD"}), 400
+    if args.get("sentiment"):
+        filters.append(ContactMessage.sentiment == args["sentiment"])
+
+    return streaming_download(stream_rows(ContactMessage, MESSAGE_EXPORT_COLUMNS, fmt, filters),
+                              fmt, "contact_messages")
+
+
 # ---------- PRODUCTS MANAGEMENT ----------
 UPLOAD_FOLDER = os.path.join("static", "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -232,6 +1125,56 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# ---------- PRICE RANGES ----------
+# Bucket boundaries in whole rupees, e.g. PRICE_BUCKETS=5000,10000,20000. Keys keep
+# the original "under10000" / "10000to20000" / "above20000" form; after
+# changing the boundaries run `flask refresh-price-ranges` once.
+PRICE_BUCKETS = sorted(float(b) for b in os.environ.get("PRICE_BUCKETS", "10000,20000").split(",") if b.strip())
+
+
+def _rupees(amount, prefix="Rs."):
+    return f"{prefix}{amount:,.0f}"
+
+
+def price_ranges():
+    """[(key, label)] for every bucket, cheapest first."""
+    # Plain digits ("1000000", never "1e+06") keep the keys stable and URL-safe
+    bounds = [f"{b:.0f}" for b in PRICE_BUCKETS]
+    if not bounds:
+        return [("all", "Any price")]
+    ranges = [(f"under{bounds[0]}", f"Under {_rupees(PRICE_BUCKETS[0])}")]
+    for i in range(1, len(bounds)):
+        ranges.append((f"{bounds[i - 1]}to{bounds[i]}",
+                       f"{_rupees(PRICE_BUCKETS[i - 1])}–{_rupees(PRICE_BUCKETS[i])}"))
+    ranges.append((f"above{bounds[-1]}", f"Above {_rupees(PRICE_BUCKETS[-1])}"))
+    return ranges
+
+
+PRICE_RANGE_KEYS = [key for key, _ in price_ranges()]
+
+
+def price_range_for(price):
+    return PRICE_RANGE_KEYS[bisect_right(PRICE_BUCKETS, price)]
+
+
+@app.cli.command("refresh-price-ranges")
+def refresh_price_ranges_command():
+    """Recompute Product.price_range after PRICE_BUCKETS changed (one UPDATE)."""
+    products = Product.__table__
+    bucket = case(
+        *[(products.c.price < bound, key) for bound, key in zip(PRICE_BUCKETS, PRICE_RANGE_KEYS)],
+        else_=PRICE_RANGE_KEYS[-1]
+    )
+    connection = bind_connection(Product)
+    result = connection.execute(
+        update(products).where(products.c.price_range.is_distinct_from(bucket)).values(price_range=bucket)
+    )
+    if result.rowcount:
+        bump_catalog_version(connection)
+    db.session.commit()
+    click.echo(f"Updated the price range of {result.rowcount} products")
+
+
 @app.route("/add-product", methods=["GET", "POST"])
 def add_product():
 
@@ -245,17 +1188,11 @@ def add_product():
         image_file = request.files.get("image")
         image_path = None
         if image_file and image_file.filename != "" and allowed_file(image_file.filename):
-            filename = secure_filename(image_file.filename)
-            image_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            image_file.save(image_path)
+            # Stored under its content hash: duplicates are kept once, names never collide
+            image_path = images.store_upload(image_file, app.config["UPLOAD_FOLDER"])
 
         # Auto price range
-        if price < 10000:
-            price_range = "under10000"
-        elif price < 20000:
-            price_range = "10000to20000"
-        else:
-            price_range = "above20000"
+        price_range = price_range_for(price)
 
         # Save product
         new_product = Product(
@@ -268,6 +1205,7 @@ def add_product():
         )
         db.session.add(new_product)
         db.session.commit()
+        queue_image_variants(image_path)
         flash("✅ Product added successfully!", "success")
         return redirect(url_for("admin_dashboard"))
 
@@ -295,23 +1233,191 @@ def update_product(product_id):
         product.name = request.form["name"]
         product.category = request.form["category"]
         product.price = float(request.form["price"])
+        product.price_range = price_range_for(product.price)
         product.description = request.form["description"]
 
         # Handle image update
         image_file = request.files.get("image")
-        if image_file and image_file.filename != "":
-            filename = secure_filename(image_file.filename)
-            image_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            image_file.save(image_path)
-            product.image = image_path
+        image_path = None
+        if image_file and image_file.filename != "" and allowed_file(image_file.filename):
+            image_path = images.store_upload(image_file, app.config["UPLOAD_FOLDER"])
+            if image_path != product.image:
+                product.image = image_path
+                product.image_variants = None
 
         db.session.commit()
+        queue_image_variants(image_path)
         flash("✅ Product updated successfully", "success")
         return redirect(url_for("manage_products"))
 
     return render_template("update_product.html", product=product)
 
 
+# ---------- BULK IMPORT / EXPORT ----------
+PRODUCT_EXPORT_COLUMNS = ("id", "name", "category", "price", "description", "image", "price_range")
+IMPORT_CHUNK_SIZE = 1000
+
+
+def product_row(record):
+    """Validate one imported record and build its insert parameters."""
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    name = (record.get("name") or "").strip()
+    category = (record.get("category") or "").strip()
+    if not name or not category:
+        raise ValueError("name and category are required")
+    price = float(record.get("price"))
+    # float() also accepts "nan" and "inf", which the catalog JSON cannot carry
+    if not 0 <= price < float("inf"):
+        raise ValueError(f"invalid price {record.get('price')!r}")
+    return {
+        "name": name,
+        "category": category,
+        "price": price,
+        "description": record.get("description") or None,
+        "image": record.get("image") or None,
+        "price_range": price_range_for(price),
+    }
+
+
+def import_products(records, chunk_size=IMPORT_CHUNK_SIZE, max_errors=20):
+    """Insert (line_number, record) pairs with one executemany per chunk.
+
+    Each chunk is its own transaction. Invalid rows are skipped and reported.
+    """
+    products = Product.__table__
+    imported, errors = 0, []
+    for chunk in bulk_io.chunked(records, chunk_size):
+        rows = []
+        for line_number, record in chunk:
+            try:
+                rows.append(product_row(record))
+            except (TypeError, ValueError) as e:
+                if len(errors) < max_errors:
+                    errors.append(f"line {line_number}: {e}")
+        if not rows:
+            continue
+
+        # Core executemany skips the mapper events, so keep the dashboard
+        # counters and catalog version in step within the same transaction
+        connection = bind_connection(Product)
+        connection.execute(insert(products), rows)
+        per_category = defaultdict(int)
+        for row in rows:
+            per_category[row["category"]] += 1
+        for category, count in per_category.items():
+            bump_category(connection, category, count)
+        bump_catalog_version(connection)
+        db.session.commit()
+        imported += len(rows)
+    return imported, errors
+
+
+def stream_rows(model, columns, fmt, filters=()):
+    """Generator of CSV/JSONL text for a table, read through a yield_per cursor."""
+    table = model.__table__
+    query = (select(*(table.c[name] for name in columns))
+             .where(*filters)
+             .order_by(table.c.id)
+             .execution_options(yield_per=IMPORT_CHUNK_SIZE))
+    rows = db.session.execute(query, bind_arguments={"bind": db.engines[model.__bind_key__]})
+    try:
+        yield from bulk_io.iter_serialized(rows, columns, fmt)
+    finally:
+        rows.close()
+
+
+def export_products(fmt):
+    """The whole catalog, streamed in id order."""
+    return stream_rows(Product, PRODUCT_EXPORT_COLUMNS, fmt)
+
+
+def streaming_download(chunks, fmt, name):
+    return Response(
+        stream_with_context(chunks),
+        mimetype=bulk_io.MIMETYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={name}.{fmt}"}
+    )
+
+
+@app.route("/admin/products/import", methods=["POST"])
+@admin_required
+def bulk_import_products():
+    upload = request.files.get("file")
+    if not upload or upload.filename == "":
+        return jsonify({"error": "Upload a CSV or JSONL file as 'file'"}), 400
+    fmt = bulk_io.resolve_format(request.form.get("format") or bulk_io.detect_format(upload.filename))
+    if fmt is None:
+        return jsonify({"error": f"format must be one of {', '.join(bulk_io.FORMATS)}"}), 400
+
+    imported, errors = import_products(bulk_io.read_records(upload.stream, fmt))
+    return jsonify({"imported": imported, "errors": errors})
+
+
+@app.route("/admin/products/export")
+@admin_required
+def bulk_export_products():
+    fmt = bulk_io.resolve_format(request.args.get("format", "csv"))
+    if fmt is None:
+        return jsonify({"error": f"format must be one of {', '.join(bulk_io.FORMATS)}"}), 400
+    return streaming_download(export_products(fmt), fmt, "products")
+
+
+@app.cli.command("import-products")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(bulk_io.FORMATS), help="Defaults to the file extension.")
+@click.option("--chunk-size", default=IMPORT_CHUNK_SIZE, show_default=True)
+def import_products_command(path, fmt, chunk_size):
+    """Bulk-load products from a CSV or JSON Lines file."""
+    with open(path, "rb") as f:
+        imported, errors = import_products(
+            bulk_io.read_records(f, fmt or bulk_io.detect_format(path)), chunk_size
+        )
+    for error in errors:
+        click.echo(f"skipped {error}", err=True)
+    click.echo(f"Imported {imported} products")
+
+
+@app.cli.command("export-products")
+@click.option("--format", "fmt", type=click.Choice(bulk_io.FORMATS), default="csv", show_default=True)
+@click.option("-o", "--output", type=click.File("w"), default="-")
+def export_products_command(fmt, output):
+    """Stream the product catalog as CSV or JSON Lines."""
+    for chunk in export_products(fmt):
+        output.write(chunk)
+
+
+# ---------- IMAGE VARIANTS ----------
+# Thumbnails/WebP variants are generated off the request path; the product
+# row records which widths exist once they are on disk.
+def generate_image_variants(paths):
+    with app.app_context():
+        for path in set(paths):
+            widths = ",".join(str(w) for w in images.build_variants(path))
+            if not widths:
+                continue
+            for product in Product.query.filter(Product.image == path):
+                product.image_variants = widths
+        db.session.commit()
+
+
+image_worker = BatchWorker("images", generate_image_variants, max_queue=500, batch_size=8, max_wait=0.1)
+
+
+def queue_image_variants(image_path):
+    if image_path and not image_worker.submit(image_path):
+        print("❌ Image queue full, run `flask build-image-variants` later:", image_path)
+
+
+@app.cli.command("build-image-variants")
+def build_image_variants_command():
+    """Generate variants for every product image that does not have them yet."""
+    paths = [p for (p,) in db.session.query(Product.image).filter(
+        Product.image.isnot(None), Product.image_variants.is_(None)).distinct()]
+    generate_image_variants(paths)
+    click.echo(f"Processed {len(paths)} images")
+
+
 with open("data/chat.json", "r") as f:
     data = json.load(f)
     faqs = data["faq"]
@@ -320,62 +1426,333 @@ with open("data/chat.json", "r") as f:
 questions = [" ".join(faq["keywords"]) for faq in faqs]
 answers = [faq["answer"] for faq in faqs]
 
+# Keyword fallback: one automaton over every keyword instead of a nested loop
+keyword_matcher = KeywordMatcher(faqs)
 
-def get_answer(user_input, threshold=0.4):
-    user_input = user_input.lower().strip()
+# Normalized question -> answer
+answer_cache = TTLCache(
+    maxsize=int(os.environ.get("FAQ_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("FAQ_CACHE_TTL", 600))
+)
+
+NO_ANSWER = "❌ Sorry, I don't understand."
+
+# Cached answers came from the old model, so drop them on hot reload
+ml_models.register("faq_model", "models/faq_model.pkl",
+                   on_reload=lambda name, model: answer_cache.clear())
+ml_models.register("faq_index", "models/faq_index.pkl",
+                   on_reload=lambda name, model: answer_cache.clear())
+
+# "classifier" (the default): faq_model only. "index" opts in to similarity
+# search over models/faq_index.pkl (falling back to the classifier while no
+# index has been built); FAQ_INDEX_THRESHOLD has only been checked against
+# the FAQ keywords themselves, so tune it on real questions first.
+FAQ_RETRIEVAL = os.environ.get("FAQ_RETRIEVAL", "classifier")
+FAQ_INDEX_THRESHOLD = float(os.environ.get("FAQ_INDEX_THRESHOLD", 0.35))
+
+
+def get_answers(user_inputs, threshold=0.4):
+    """Answer many questions with one index search / predict_proba call for the cache misses."""
+    questions = [normalize_question(q) for q in user_inputs]
+
+    # Fetch the model first: a hot reload clears the answer cache
+    faq_index = ml_models.get("faq_index") if FAQ_RETRIEVAL == "index" else None
+    faq_model = ml_models.get("faq_model") if faq_index is None else None
+    answers = [answer_cache.get(q) for q in questions]
+    misses = [i for i, ans in enumerate(answers) if ans is None]
+    if not misses:
+        return answers
 
     try:
-        # Get probabilities for each class
-        probs = faq_model.predict_proba([user_input])[0]
-        max_prob = max(probs)
-        predicted_answer = faq_model.predict([user_input])[0]
-
-        # Only accept if confidence is high enough
-        if max_prob >= threshold:
-            return predicted_answer
+        if faq_index is not None:
+            # One sparse matrix product against every FAQ phrasing
+            with MODEL_LATENCY.time(model="faq_index"):
+                hits = faq_index.search_many([questions[i] for i in misses])
+            best = [(faq_index.answers[top[0][0]] if top and top[0][1] >= FAQ_INDEX_THRESHOLD else None)
+                    for top in hits]
+        elif faq_model is not None:
+            # One predict_proba pass; the best class *is* the predicted answer
+            with MODEL_LATENCY.time(model="faq"):
+                probs = faq_model.predict_proba([questions[i] for i in misses])
+            # Only accept if confidence is high enough
+            best = [(faq_model.classes_[row.argmax()] if row.max() >= threshold else None)
+                    for row in probs]
         else:
-            # fallback: keyword search
-            for faq in faqs:
-                for keyword in faq['keywords']:
-                    if keyword.lower() in user_input:
-                        return faq['answer']
-            return "❌ Sorry, I don't understand."
-
+            raise RuntimeError("FAQ model not loaded")
     except Exception as e:
         print("Error in prediction:", e)
-        return "❌ Sorry, I don't understand."
+        for i in misses:
+            answers[i] = NO_ANSWER
+        return answers
 
+    for i, ans in zip(misses, best):
+        if ans is None:
+            # fallback: keyword search
+            match = keyword_matcher.find(questions[i])
+            ans = faqs[match]["answer"] if match is not None else NO_ANSWER
+        answer_cache.set(questions[i], ans)
+        answers[i] = ans
+    return answers
+
+
+def get_answer(user_input, threshold=0.4):
+    return get_answers([user_input], threshold)[0]
+
+
+# ---------- CHAT CHANNEL ----------
+# Messages from the persistent chat socket (asgi.py) are answered in
+# micro-batches across all connected sessions. A follow-up the model cannot
+# place on its own ("and the price?") is retried together with the
+# session's previous question.
+def answer_chat_turns(turns):
+    """turns are (message, previous_message or None) pairs."""
+    replies = get_answers([message for message, _ in turns])
+    retry = [i for i, (_, previous) in enumerate(turns) if replies[i] == NO_ANSWER and previous]
+    if retry:
+        with_context = get_answers([f"{turns[i][1]} {turns[i][0]}" for i in retry])
+        for i, ans in zip(retry, with_context):
+            if ans != NO_ANSWER:
+                replies[i] = ans
+    return replies
+
+
+def answer_chat_batch(items):
+    """Worker handler: items are (message, previous, callback) triples."""
+    try:
+        replies = answer_chat_turns([(message, previous) for message, previous, _ in items])
+    except Exception:
+        # Nobody may be left waiting on a reply
+        for _, _, callback in items:
+            callback(NO_ANSWER)
+        raise
+    for (_, _, callback), reply in zip(items, replies):
+        callback(reply)
 
 
+chat_worker = BatchWorker(
+    "chat", answer_chat_batch,
+    max_queue=int(os.environ.get("CHAT_QUEUE_SIZE", 10000)),
+    batch_size=64, max_wait=0.005
+)
 
 
 @app.route("/get_answer", methods=["POST"])
 def answer():
-    user_input = request.json.get("message")
+    payload = request.get_json(silent=True)
+    user_input = payload.get("message", "") if isinstance(payload, dict) else ""
     ans = get_answer(user_input)
     return jsonify({"answer": ans})
 
 # ---------- FRONTEND PAGES ----------
 @app.route("/products")
 def products():
-    return render_template("products.html")
+    return render_template("products.html", price_ranges=price_ranges())
 
 # ---------- API ENDPOINT ----------
+PRODUCTS_PAGE_SIZE = 24
+PRODUCTS_MAX_PAGE_SIZE = 100
+
+# sort key -> (columns the keyset is built on, descending?)
+PRODUCT_SORTS = {
+    "id": ((Product.id,), False),
+    "price_asc": ((Product.price, Product.id), False),
+    "price_desc": ((Product.price, Product.id), True),
+}
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    """Keyset values for `columns`; ValueError unless each is a scalar of the column's type."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("cursor does not match sort")
+    for value, col in zip(values, columns):
+        expected = col.type.python_type
+        # ints are valid for float columns; bools are never valid keys
+        allowed = (int, float) if expected is float else (expected,)
+        if isinstance(value, bool) or not isinstance(value, allowed):
+            raise ValueError(f"cursor value for {col.key} must be {expected.__name__}")
+    return values
+
+
+def product_to_dict(p, uploads_url=None):
+    if uploads_url is None:
+        uploads_url = url_for("static", filename="uploads/")
+    return {
+        "id": p.id,
+        "name": p.name,
+        "category": p.category,
+        "price": p.price,
+        "description": p.description,
+        "price_range": p.price_range,
+        # Store relative path for image
+        "image": uploads_url + os.path.basename(p.image) if p.image else None,
+        **image_variant_urls(p, uploads_url)
+    }
+
+
+def image_variant_urls(p, uploads_url):
+    if not (p.image and p.image_variants):
+        return {"thumbnail": None, "srcset": None}
+    name = os.path.basename(p.image)
+    widths = [int(w) for w in p.image_variants.split(",")]
+    return {
+        "thumbnail": uploads_url + images.variant_path(name, images.THUMBNAIL_WIDTH)
+        if images.THUMBNAIL_WIDTH in widths else None,
+        "srcset": ", ".join(f"{uploads_url}{images.variant_path(name, w, 'webp')} {w}w" for w in widths)
+    }
+
+
+def filter_products(query, args):
+    """Apply the catalog filters shared by the product API endpoints."""
+    if args.get("category"):
+        query = query.filter(Product.category == args["category"])
+    if args.get("price_range"):
+        query = query.filter(Product.price_range == args["price_range"])
+    if args.get("min_price"):
+        query = query.filter(Product.price >= float(args["min_price"]))
+    if args.get("max_price"):
+        query = query.filter(Product.price <= float(args["max_price"]))
+    if args.get("q"):
+        pattern = f"%{args['q'].strip()}%"
+        query = query.filter(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+    return query
+
+
 @app.route("/api/products")
+@catalog_cached
 def api_products():
-    products = Product.query.all()
-    product_list = []
-    for p in products:
-        product_list.append({
-            "id": p.id,
-            "name": p.name,
-            "category": p.category,
-            "price": p.price,
-            "description": p.description,
-            # Store relative path for image
-            "image": url_for("static", filename=f"uploads/{os.path.basename(p.image)}") if p.image else None
-        })
-    return jsonify(product_list)
+    args = request.args
+    sort = args.get("sort", "id")
+    if sort not in PRODUCT_SORTS:
+        return jsonify({"error": f"Unknown sort '{sort}'"}), 400
+    columns, descending = PRODUCT_SORTS[sort]
+
+    try:
+        limit = min(max(int(args.get("limit", PRODUCTS_PAGE_SIZE)), 1), PRODUCTS_MAX_PAGE_SIZE)
+        query = filter_products(Product.query, args)
+        if args.get("cursor"):
+            last = decode_cursor(args["cursor"], columns)
+            key, last = tuple_(*columns), tuple_(*last)
+            query = query.filter(key < last if descending else key > last)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid limit, price or cursor parameter"}), 400
+
+    order = [c.desc() for c in columns] if descending else list(columns)
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(*order).limit(limit + 1).all()
+    page = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_row = page[-1]
+        next_cursor = encode_cursor([getattr(last_row, c.key) for c in columns])
+
+    uploads_url = url_for("static", filename="uploads/")
+    return jsonify({
+        "items": [product_to_dict(p, uploads_url) for p in page],
+        "next_cursor": next_cursor
+    })
+
+
+@app.route("/api/products/facets")
+@catalog_cached
+def api_product_facets():
+    """Product counts per category and per price range for the filter dropdowns.
+
+    Each facet is counted with every other active filter applied but not its
+    own, so the dropdowns show what picking another option would return. One
+    GROUP BY (category, price_range) query gives the whole cross table. A
+    search is matched through FTS like /api/products/search, so the counts
+    agree with the results the grid shows.
+    """
+    args = request.args
+    others = {k: v for k, v in args.items() if k not in ("category", "price_range")}
+    query = db.session.query(Product.category, Product.price_range, func.count(Product.id))
+    match = fts_match_query(others.get("q", "")) if FTS_ENABLED else ""
+    if match:
+        query = match_products(query, match)
+        del others["q"]
+    try:
+        rows = filter_products(query, others).group_by(Product.category, Product.price_range).all()
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid price parameter"}), 400
+
+    category, price_range = args.get("category"), args.get("price_range")
+    by_category, by_range, total = defaultdict(int), defaultdict(int), 0
+    for row_category, row_range, count in rows:
+        # Categories that only have matches outside the price range stay listed, at 0
+        by_category[row_category] += count if not price_range or row_range == price_range else 0
+        if not category or row_category == category:
+            by_range[row_range] += count
+            if not price_range or row_range == price_range:
+                total += count
+    return jsonify({
+        "total": total,
+        "categories": [{"value": name, "count": count} for name, count in sorted(by_category.items())],
+        # Every configured bucket, in price order, including empty ones
+        "price_ranges": [{"value": key, "label": label, "count": by_range.get(key, 0)}
+                         for key, label in price_ranges()],
+    })
+
+product_fts = table("product_fts", column("rowid"))
+
+# Column weights for bm25(): name matches rank above category, then description
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def fts_match_query(user_text):
+    # Quote every term so FTS syntax characters in user input are inert, and
+    # prefix-match them all so partially typed words already find results
+    terms = re.findall(r"\w+", user_text.lower())
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def match_products(query, match):
+    """Restrict a query over Product to the FTS matches of `match` (see fts_match_query)."""
+    return (query.join(product_fts, product_fts.c.rowid == Product.id)
+            .filter(literal_column("product_fts").op("MATCH")(match)))
+
+
+@app.route("/api/products/search")
+@catalog_cached
+def api_products_search():
+    args = request.args
+    match = fts_match_query(args.get("q", ""))
+    if not match:
+        return jsonify({"error": "Missing search query 'q'"}), 400
+
+    try:
+        limit = min(max(int(args.get("limit", PRODUCTS_PAGE_SIZE)), 1), PRODUCTS_MAX_PAGE_SIZE)
+        page = max(int(args.get("page", 1)), 1)
+        filters = {k: v for k, v in args.items() if k != "q"}
+        if FTS_ENABLED:
+            rank = func.bm25(literal_column("product_fts"), *FTS_WEIGHTS)
+            query = filter_products(match_products(Product.query, match), filters).order_by(rank, Product.id)
+        else:
+            query = filter_products(Product.query, args).order_by(Product.id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid page, limit or price parameter"}), 400
+
+    rows = query.limit(limit + 1).offset((page - 1) * limit).all()
+    uploads_url = url_for("static", filename="uploads/")
+    return jsonify({
+        "items": [product_to_dict(p, uploads_url) for p in rows[:limit]],
+        "page": page,
+        "next_page": page + 1 if len(rows) > limit else None
+    })
+
+
+@app.route("/api/products/<int:product_id>/recommendations")
+@catalog_cached
+def api_product_recommendations(product_id):
+    return jsonify({"product_id": product_id, **product_recommendations(product_id)})
+
 
 @app.route("/orders")
 def orders():
@@ -393,12 +1770,134 @@ def install(product_id):
     # Pre-fill product info and redirect to services form
     return render_template(
         "services.html",
+        product_id=product.id,
         product_name=product.name,
         product_price=product.price,
-        product_image = product.image
+        product_image = product.image,
+        recommendations=product_recommendations(product.id)
     )
 
 
+# ---------- SERVICE CAPACITY ----------
+# Each (service_type, day) has a ServiceSlot row with a technician capacity
+# (SERVICE_DAILY_CAPACITY, or per type from the SERVICE_CAPACITY JSON map).
+# Slots are created on first booking; booking and inserting the order
+# happen in one transaction, and the reservation is a single conditional
+# UPDATE, so concurrent submissions can never overbook a day.
+SERVICE_DAILY_CAPACITY = int(os.environ.get("SERVICE_DAILY_CAPACITY", 8))
+SERVICE_CAPACITY = json.loads(os.environ.get("SERVICE_CAPACITY", "{}"))
+SERVICE_BOOKING_DAYS = int(os.environ.get("SERVICE_BOOKING_DAYS", 90))   # how far ahead
+AVAILABILITY_MAX_DAYS = 90
+
+
+def slot_capacity(service_type):
+    return int(SERVICE_CAPACITY.get(service_type, SERVICE_DAILY_CAPACITY))
+
+
+def create_slot(day, service_type, capacity=None):
+    """Insert the slot row in its own transaction; a no-op if it already exists.
+
+    Orders booked before slots existed count against the new slot.
+    """
+    slots = ServiceSlot.__table__
+    try:
+        with db.engines[ServiceSlot.__bind_key__].begin() as conn:
+            booked = conn.execute(
+                select(func.count()).select_from(ServiceOrder.__table__)
+                .where(ServiceOrder.__table__.c.service_date == day,
+                       ServiceOrder.__table__.c.service_type == service_type)
+            ).scalar()
+            conn.execute(insert(slots).values(
+                day=day, service_type=service_type, booked=booked,
+                capacity=slot_capacity(service_type) if capacity is None else capacity))
+    except IntegrityError:
+        pass   # created concurrently
+
+
+def reserve_slot(connection, day, service_type):
+    """Take one place in the slot; False when it is full."""
+    slots = ServiceSlot.__table__
+    key = (slots.c.service_type == service_type) & (slots.c.day == day)
+    # Checked before the UPDATE: on SQLite a write (even one matching no
+    # rows) would hold the lock the slot insert needs
+    if connection.execute(select(slots.c.id).where(key)).first() is None:
+        create_slot(day, service_type)
+    return connection.execute(
+        update(slots).where(key, slots.c.booked < slots.c.capacity).values(booked=slots.c.booked + 1)
+    ).rowcount == 1
+
+
+def release_slot(connection, day, service_type):
+    slots = ServiceSlot.__table__
+    connection.execute(
+        update(slots)
+        .where(slots.c.service_type == service_type, slots.c.day == day, slots.c.booked > 0)
+        .values(booked=slots.c.booked - 1)
+    )
+
+
+def save_service_order(values):
+    """Reserve the slot and insert the order in one transaction.
+
+    Returns the new order id, or None when the day is fully booked.
+    """
+    if not reserve_slot(bind_connection(ServiceSlot), values["service_date"], values["service_type"]):
+        db.session.rollback()
+        return None
+    order = ServiceOrder(**values)
+    db.session.add(order)
+    db.session.commit()
+    order_id = order.id
+    roll_up_new_orders()
+    return order_id
+
+
+@app.route("/api/services/availability")
+def api_service_availability():
+    args = request.args
+    service_type = args.get("service")
+    if not service_type:
+        return jsonify({"error": "service is required"}), 400
+    try:
+        start = Date.fromisoformat(args["start"]) if args.get("start") else Date.today()
+        days = min(max(int(args.get("days", 14)), 1), AVAILABILITY_MAX_DAYS)
+    except ValueError:
+        return jsonify({"error": "start must be YYYY-MM-DD and days a number"}), 400
+    end = start + timedelta(days=days - 1)
+
+    # One range scan on (service_type, day); days without a row are untouched
+    slots = {slot.day: slot for slot in ServiceSlot.query.filter(
+        ServiceSlot.service_type == service_type,
+        ServiceSlot.day.between(start, end)
+    )}
+    default = slot_capacity(service_type)
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        slot = slots.get(day)
+        capacity, booked = (slot.capacity, slot.booked) if slot else (default, 0)
+        series.append({"date": day.isoformat(), "capacity": capacity, "booked": booked,
+                       "available": max(capacity - booked, 0)})
+    return jsonify({"service": service_type, "start": start.isoformat(), "days": series})
+
+
+@app.cli.command("set-slot-capacity")
+@click.argument("day")
+@click.argument("service_type")
+@click.argument("capacity", type=int)
+def set_slot_capacity_command(day, service_type, capacity):
+    """Set technician capacity for one day and service type (0 closes the day)."""
+    try:
+        day = Date.fromisoformat(day)
+    except ValueError:
+        raise click.BadParameter("DAY must be YYYY-MM-DD")
+    create_slot(day, service_type, capacity)
+    slot = ServiceSlot.query.filter_by(service_type=service_type, day=day).one()
+    slot.capacity = capacity
+    db.session.commit()
+    click.echo(f"{service_type} on {day}: {slot.booked}/{slot.capacity} booked")
+
+
 @app.route("/services", methods=["GET", "POST"])
 def services():
     if request.method == "POST":
@@ -410,33 +1909,688 @@ def services():
 
         product_name = request.form.get("product_name")
         product_price = request.form.get("product_price")
-        product_image = request.files.get("product_image")
 
-        order = ServiceOrder(
+        service_date = parse_service_date(date)
+        today = Date.today()
+
+        def refuse(error, status):
+            return render_template(
+                "services.html", error=error,
+                product_id=request.form.get("product_id", type=int),
+                product_name=product_name, product_price=product_price
+            ), status
+
+        if not service_type:
+            return refuse("❌ Please choose a service.", 400)
+        if service_date is None or not today <= service_date <= today + timedelta(days=SERVICE_BOOKING_DAYS):
+            return refuse(f"❌ Please choose a date within the next {SERVICE_BOOKING_DAYS} days.", 400)
+        try:
+            price = float(product_price or 0)
+        except ValueError:
+            price = None
+        # Also rejects nan/inf, which float() accepts
+        if price is None or not 0 <= price < float("inf"):
+            return refuse("❌ The product price is not valid. Please book again from the product page.", 400)
+
+        values = dict(
             name=name,
             phone=phone,
             service_type=service_type,
             date=date,
+            service_date=service_date,
             address=address,
             product_name=product_name,
-            price=product_price
+            price=price,
+            product_id=request.form.get("product_id", type=int),
+            user_id=session.get("user_id")
         )
-        db.session.add(order)
-        db.session.commit()
+        # Bookings always wait for the commit: it is what decides whether the day had room
+        ticket = write_behind("service", values)
+        if ticket is None:
+            order_id = save_service_order(values)
+        else:
+            outcome = await_write(ticket)
+            if outcome == "pending":
+                return refuse(f"⏳ Your booking is still being confirmed. Please do not book again; "
+                              f"we will call you on {phone} once it is done.", 202)
+            if outcome != "done":
+                return refuse("❌ We could not confirm your booking right now. Please try again.", 503)
+            order_id = ticket.result
+        if order_id is None:
+            return refuse(f"❌ {service_type} is fully booked on {service_date:%d %b %Y}. Please pick another day.", 409)
         return redirect(url_for("thank_you"))
 
     return render_template("services.html")
 
-def get_sentiment(message):
-    if not isinstance(message, str):
-        message = str(message)
+SENTIMENT_BATCH_LIMIT = 1000
+
 
+def get_sentiments(messages):
+    """Classify many messages with one sparse transform + predict_proba call.
+
+    Returns a list of (label, confidence) pairs in input order.
+    """
+    messages = [m if isinstance(m, str) else str(m) for m in messages]
+    vectorizer = ml_models.get("vectorizer")
+    naive_bayes_model = ml_models.get("naive_bayes_model")
     if vectorizer is None or naive_bayes_model is None:
-        return "Error: Model not loaded"
+        return [("Error: Model not loaded", None)] * len(messages)
+    if not messages:
+        return []
+
+    with MODEL_LATENCY.time(model="sentiment"):
+        X = vectorizer.transform(messages)
+        try:
+            probs = naive_bayes_model.predict_proba(X)
+        except ValueError:
+            # Vectorizer and classifier come from different training runs
+            # (caught mid-swap): re-check both files and try once more
+            ml_models.reload()
+            vectorizer = ml_models.get("vectorizer")
+            naive_bayes_model = ml_models.get("naive_bayes_model")
+            X = vectorizer.transform(messages)
+            probs = naive_bayes_model.predict_proba(X)
+    best = probs.argmax(axis=1)
+    classes = naive_bayes_model.classes_
+    return [(str(classes[i]), float(probs[row, i])) for row, i in enumerate(best)]
+
+
+def get_sentiment(message):
+    return get_sentiments([message])[0][0]
+
+
+def store_sentiments(rows, scores):
+    """Write (label, score) to rows of (id, created_at, sentiment as read).
+
+    Each UPDATE only matches while the sentiment is still the value that was
+    read, so when two workers classify the same message (every process
+    re-queues pending rows at startup) only one of them moves the trends.
+    """
+    messages = ContactMessage.__table__
+    connection = bind_connection(ContactMessage)
+    settled = []
+    for row, (label, score) in zip(rows, scores):
+        result = connection.execute(
+            update(messages)
+            .where(messages.c.id == row[0], messages.c.sentiment.is_not_distinct_from(row[2]))
+            .values(sentiment=label, sentiment_score=score)
+        )
+        if result.rowcount:
+            settled.append((row, label))
+    bump_sentiment_trends(connection, sentiment_changes([row for row, _ in settled],
+                                                        [label for _, label in settled]))
+
+
+def rescore_messages(chunk_size=500, pending_only=False):
+    """Re-classify every ContactMessage in id order, one batch per chunk."""
+    last_id, total = 0, 0
+    while True:
+        query = db.session.query(ContactMessage.id, ContactMessage.message,
+                                 ContactMessage.created_at, ContactMessage.sentiment)
+        if pending_only:
+            query = query.filter(ContactMessage.sentiment == SENTIMENT_PENDING)
+        rows = (query.filter(ContactMessage.id > last_id)
+                .order_by(ContactMessage.id)
+                .limit(chunk_size)
+                .all())
+        if not rows:
+            return total
+        scores = get_sentiments([r.message for r in rows])
+        store_sentiments([(r.id, r.created_at, r.sentiment) for r in rows], scores)
+        db.session.commit()
+        last_id = rows[-1].id
+        total += len(rows)
+
+
+@app.cli.command("rescore-sentiment")
+@click.option("--chunk-size", default=500, show_default=True)
+@click.option("--pending-only", is_flag=True, help="Only classify messages still marked pending.")
+def rescore_sentiment_command(chunk_size, pending_only):
+    """Re-run the sentiment model over all contact messages."""
+    if ml_models.get("vectorizer") is None or ml_models.get("naive_bayes_model") is None:
+        raise click.ClickException("Sentiment model not loaded")
+    total = rescore_messages(chunk_size, pending_only)
+    click.echo(f"Re-scored {total} messages")
+
+
+# ---------- RETRAINING ----------
+@app.cli.command("train-faq")
+def train_faq_command():
+    """Refit the FAQ chatbot model and update the FAQ index from data/chat.json."""
+    run = training.train_faq(faqs)
+    click.echo(f"faq_model v{run['version']}: {run['samples']} samples, "
+               f"accuracy {run['accuracy']}, {run['train_seconds']}s")
+    run = training.build_faq_index(faqs)
+    click.echo(f"faq_index v{run['version']} ({run['mode']}): {run['samples']} entries vectorized, "
+               f"accuracy {run['accuracy']}, {run['train_seconds']}s")
+
+
+@app.cli.command("build-faq-index")
+@click.option("--full", is_flag=True, help="Re-vectorize every entry instead of only the changed ones.")
+def build_faq_index_command(full):
+    """Update the FAQ similarity index from data/chat.json."""
+    run = training.build_faq_index(faqs, full=full)
+    click.echo(f"faq_index v{run['version']} ({run['mode']}): {run['samples']} entries vectorized, "
+               f"accuracy {run['accuracy']}, {run['train_seconds']}s")
+
+
+def mark_labels_trained(rows):
+    """Record the label each (id, label) row was trained with.
+
+    Rows relabelled while the model was training keep their old
+    trained_label and are picked up again by the next run.
+    """
+    messages = ContactMessage.__table__
+    connection = bind_connection(ContactMessage)
+    if rows:
+        connection.execute(
+            update(messages)
+            .where(messages.c.id == bindparam("b_id"), messages.c.label == bindparam("b_label"))
+            .values(trained_label=bindparam("b_label")),
+            [{"b_id": msg_id, "b_label": label} for msg_id, label in rows]
+        )
+    db.session.commit()
+
+
+def adopt_sentiment_watermark():
+    # Older runs tracked the highest trained message id in the manifest
+    manifest = training.load_manifest()
+    watermark = manifest.pop("sentiment_watermark", None)
+    if watermark is None:
+        return
+    messages = ContactMessage.__table__
+    bind_connection(ContactMessage).execute(
+        update(messages)
+        .where(messages.c.id <= watermark, messages.c.label.isnot(None), messages.c.trained_label.is_(None))
+        .values(trained_label=messages.c.label)
+    )
+    db.session.commit()
+    training.save_manifest(manifest)
+
+
+@app.cli.command("train-sentiment")
+@click.option("--full", is_flag=True, help="Rebuild from the seed dataset plus every labelled message.")
+def train_sentiment_command(full):
+    """Update the sentiment model with admin-labelled contact messages."""
+    adopt_sentiment_watermark()
+    query = (db.session.query(ContactMessage.id, ContactMessage.message, ContactMessage.label)
+             .filter(ContactMessage.label.isnot(None)))
+    untrained = ContactMessage.trained_label.is_distinct_from(ContactMessage.label)
+    if not full and query.filter(untrained, ContactMessage.trained_label.isnot(None)).first():
+        # Naive Bayes cannot unlearn the old label of a relabelled message
+        click.echo("Labels changed since the last run, rebuilding the model")
+        full = True
+
+    if full:
+        texts, labels = training.seed_sentiment_data()
+        rows = query.order_by(ContactMessage.id).all()
+        texts += [r.message for r in rows]
+        labels += [r.label for r in rows]
+        run = training.train_sentiment(texts, labels)
+    else:
+        # Only messages labelled since the last run
+        rows = query.filter(untrained).order_by(ContactMessage.id).all()
+        if not rows:
+            click.echo("No newly labelled messages")
+            return
+        run = training.update_sentiment([r.message for r in rows], [r.label for r in rows])
+    mark_labels_trained([(r.id, r.label) for r in rows])
+    click.echo(f"naive_bayes_model v{run['version']} ({run['mode']}): {run['samples']} samples, "
+               f"accuracy {run['accuracy']}, {run['train_seconds']}s")
+
+
+# ---------- BACKGROUND SENTIMENT CLASSIFICATION ----------
+# /contact stores the message as "pending" and returns; the worker pool
+# classifies queued messages in micro-batches through get_sentiments().
+SENTIMENT_PENDING = "pending"
+SENTIMENT_ASYNC = os.environ.get("SENTIMENT_ASYNC", "1") != "0"
+
+
+# ---------- SENTIMENT TRENDS ----------
+# Hour/day counts per sentiment in SentimentRollup, updated in the same
+# transaction as every write that settles or changes a message's sentiment
+# (classification, re-scoring, deletion), so trends never need a table scan.
+# Pending and pre-timestamp messages are not counted.
+SENTIMENT_PERIODS = ("hour", "day")
+SENTIMENT_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+SENTIMENT_TREND_DEFAULT_SPAN = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+SENTIMENT_HOURLY_RETENTION = timedelta(days=int(os.environ.get("SENTIMENT_HOURLY_RETENTION_DAYS", 14)))
+# A bucket is a negative spike when its negative count is SPIKE_Z standard
+# deviations above the preceding SPIKE_WINDOW buckets (and at least SPIKE_MIN)
+SENTIMENT_SPIKE_WINDOW = {"hour": 24, "day": 14}
+SENTIMENT_SPIKE_Z = float(os.environ.get("SENTIMENT_SPIKE_Z", 3.0))
+SENTIMENT_SPIKE_MIN = int(os.environ.get("SENTIMENT_SPIKE_MIN", 3))
+
+_last_trend_prune = 0.0
+
+
+def sentiment_bucket(ts, period):
+    if period == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bump_sentiment_trends(connection, changes):
+    """Apply (created_at, sentiment, delta) changes to the hour/day counts."""
+    deltas = defaultdict(int)
+    for created_at, sentiment, delta in changes:
+        if created_at is None or sentiment not in training.SENTIMENT_CLASSES:
+            continue
+        for period in SENTIMENT_PERIODS:
+            deltas[(period, sentiment_bucket(created_at, period), sentiment)] += delta
+
+    table = SentimentRollup.__table__
+    for (period, bucket, sentiment), delta in deltas.items():
+        if not delta:
+            continue
+        result = connection.execute(
+            update(table)
+            .where(table.c.period == period, table.c.bucket == bucket, table.c.sentiment == sentiment)
+            .values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(period=period, bucket=bucket, sentiment=sentiment, count=delta))
+
+    # Hourly buckets are only kept for a rolling window
+    global _last_trend_prune
+    if time.monotonic() - _last_trend_prune > 3600:
+        _last_trend_prune = time.monotonic()
+        connection.execute(delete(table).where(
+            table.c.period == "hour", table.c.bucket < datetime.now() - SENTIMENT_HOURLY_RETENTION))
+
+
+def sentiment_changes(rows, new_labels):
+    """Trend changes for rows of (id, created_at, old sentiment) getting new labels."""
+    changes = []
+    for (_, created_at, old), new in zip(rows, new_labels):
+        if old != new:
+            changes.append((created_at, old, -1))
+            changes.append((created_at, new, 1))
+    return changes
+
+
+@event.listens_for(ContactMessage, "after_delete")
+def message_deleted(mapper, connection, target):
+    bump_sentiment_trends(connection, [(target.created_at, target.sentiment, -1)])
+
+
+def rebuild_sentiment_trends(chunk_size=1000):
+    """Recount SentimentRollup from scratch (after an upgrade or a manual data fix)."""
+    table = SentimentRollup.__table__
+    connection = bind_connection(ContactMessage)
+    connection.execute(delete(table))
+    counted = 0
+    query = (db.session.query(ContactMessage.created_at, ContactMessage.sentiment)
+             .filter(ContactMessage.created_at.isnot(None)))
+    for chunk in bulk_io.chunked(query.yield_per(chunk_size), chunk_size):
+        bump_sentiment_trends(connection, [(created_at, sentiment, 1) for created_at, sentiment in chunk])
+        counted += len(chunk)
+    db.session.commit()
+    return counted
+
+
+@app.cli.command("rebuild-sentiment-trends")
+def rebuild_sentiment_trends_command():
+    """Recount the hourly/daily sentiment trend table from contact messages."""
+    click.echo(f"Counted {rebuild_sentiment_trends()} timestamped messages")
+
+
+def parse_trend_time(value):
+    if "T" in value or " " in value:
+        return datetime.fromisoformat(value)
+    return datetime.combine(Date.fromisoformat(value), datetime.min.time())
+
+
+def negative_spike(history, negative):
+    if not history:
+        return 0.0, False
+    mean = sum(history) / len(history)
+    std = (sum((n - mean) ** 2 for n in history) / len(history)) ** 0.5
+    # std floor of 1: a flat zero baseline should not turn 1 message into a spike
+    z = (negative - mean) / max(std, 1.0)
+    return round(z, 2), z >= SENTIMENT_SPIKE_Z and negative >= SENTIMENT_SPIKE_MIN
+
+
+def sentiment_trend_series(period, first, last):
+    """Zero-filled buckets from `first` to `last` with per-bucket spike scores."""
+    step = SENTIMENT_STEPS[period]
+    window = SENTIMENT_SPIKE_WINDOW[period]
+
+    # Read `window` extra buckets before the range as the spike baseline
+    counts = defaultdict(dict)
+    for bucket, sentiment, count in (
+        db.session.query(SentimentRollup.bucket, SentimentRollup.sentiment, SentimentRollup.count)
+        .filter(SentimentRollup.period == period,
+                SentimentRollup.bucket >= first - window * step,
+                SentimentRollup.bucket <= last)
+    ):
+        counts[bucket][sentiment] = count
+
+    series, negatives = [], []
+    bucket = first - window * step
+    while bucket <= last:
+        point = {label: counts.get(bucket, {}).get(label, 0) for label in training.SENTIMENT_CLASSES}
+        if bucket >= first:
+            total = sum(point.values())
+            z, spike = negative_spike(negatives[-window:], point["negative"])
+            series.append({
+                "bucket": bucket.isoformat(),
+                **point,
+                "total": total,
+                "negative_share": round(point["negative"] / total, 3) if total else None,
+                "negative_z": z,
+                "negative_spike": spike,
+            })
+        negatives.append(point["negative"])
+        bucket += step
+    return series
+
+
+@app.route("/api/analytics/sentiment")
+@admin_required
+def api_sentiment_trends():
+    args = request.args
+    period = args.get("period", "hour")
+    if period not in SENTIMENT_PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(SENTIMENT_PERIODS)}"}), 400
+    try:
+        end = parse_trend_time(args["end"]) if args.get("end") else datetime.now()
+        start = parse_trend_time(args["start"]) if args.get("start") else end - SENTIMENT_TREND_DEFAULT_SPAN[period]
+    except ValueError:
+        return jsonify({"error": "start/end must be ISO dates or datetimes"}), 400
+
+    first = sentiment_bucket(start, period)
+    last = sentiment_bucket(end, period)
+    if (last - first) / SENTIMENT_STEPS[period] > 5000:
+        return jsonify({"error": "Range too long for this period"}), 400
+    series = sentiment_trend_series(period, first, last)
+
+    latest = series[-1] if series else None
+    return jsonify({
+        "period": period,
+        "start": first.isoformat(),
+        "end": last.isoformat(),
+        "series": series,
+        "totals": {label: sum(p[label] for p in series) for label in training.SENTIMENT_CLASSES},
+        "negative_spike": bool(latest and latest["negative_spike"]),
+        "spike_buckets": [p["bucket"] for p in series if p["negative_spike"]],
+    })
+
+
+def classify_messages(items):
+    """Worker handler: items are (message_id, text) pairs."""
+    scores = get_sentiments([text for _, text in items])
+    with app.app_context():
+        current = {row.id: row for row in db.session.query(
+            ContactMessage.id, ContactMessage.created_at, ContactMessage.sentiment
+        ).filter(ContactMessage.id.in_([msg_id for msg_id, _ in items]))}
+        store_sentiments([current[msg_id] for msg_id, _ in items if msg_id in current],
+                         [score for (msg_id, _), score in zip(items, scores) if msg_id in current])
+        db.session.commit()
+
+
+sentiment_worker = BatchWorker(
+    "sentiment", classify_messages,
+    max_queue=int(os.environ.get("SENTIMENT_QUEUE_SIZE", 1000)),
+    batch_size=64, max_wait=0.05,
+    threads=int(os.environ.get("SENTIMENT_WORKERS", 1))
+)
+BACKGROUND_WORKERS = {"sentiment": sentiment_worker, "images": image_worker, "chat": chat_worker}
 
-    X = vectorizer.transform([message])
-    prediction = naive_bayes_model.predict(X)[0]
-    return prediction
+
+_requeue_lock_file = None
+
+
+def claim_requeue():
+    """True in the one process (per contact database) that re-queues pending messages.
+
+    The claim is an exclusive lock held until the process exits, so when
+    several serving workers start, exactly one of them does the requeue; a
+    worker restarted after the holder died takes it over.
+    """
+    global _requeue_lock_file
+    if _requeue_lock_file is not None:
+        return True
+    with app.app_context():
+        url = str(db.engines[ContactMessage.__bind_key__].url)
+    name = f"shop-sentiment-requeue-{hashlib.sha1(url.encode()).hexdigest()[:12]}.lock"
+    lock_file = open(os.path.join(tempfile.gettempdir(), name), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _requeue_lock_file = lock_file
+    return True
+
+
+def requeue_pending_messages():
+    """Put messages left pending by a previous run back on the sentiment queue.
+
+    Anything that does not fit can be finished with
+    `flask rescore-sentiment --pending-only`.
+    """
+    if not SENTIMENT_ASYNC or not claim_requeue():
+        return
+    start_background_workers()
+    with app.app_context():
+        for msg_id, body in (db.session.query(ContactMessage.id, ContactMessage.message)
+                             .filter(ContactMessage.sentiment == SENTIMENT_PENDING)
+                             .order_by(ContactMessage.id)):
+            if not sentiment_worker.submit((msg_id, body)):
+                break
+
+
+# ---------- WRITE-BEHIND ----------
+# With WRITE_BEHIND=1, service bookings and contact messages are handed to
+# one writer thread that inserts up to WRITE_BEHIND_BATCH rows (or whatever
+# arrived within WRITE_BEHIND_WAIT_MS) per transaction, so concurrent
+# submissions share a commit instead of paying one fsync each.
+#
+# WRITE_BEHIND_ACK decides when a contact form is answered: "commit" (the
+# default) waits until its row is committed, "queued" answers as soon as it
+# is queued and can lose it if the process dies first. Bookings always wait
+# for the commit, because that is where the slot is reserved. A full queue
+# blocks the request for up to WRITE_BEHIND_BLOCK_MS, then the row is
+# written inline. Shutdown drains the queue.
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_ACK = os.environ.get("WRITE_BEHIND_ACK", "commit")
+WRITE_BEHIND_BLOCK_MS = int(os.environ.get("WRITE_BEHIND_BLOCK_MS", 200))
+WRITE_BEHIND_ACK_TIMEOUT = 10   # seconds a request waits for its commit
+
+
+def ensure_slots(values_list):
+    """Create missing slots up front: create_slot needs its own transaction."""
+    keys = {(v["service_date"], v["service_type"]) for v in values_list}
+    existing = set(db.session.query(ServiceSlot.day, ServiceSlot.service_type).filter(
+        ServiceSlot.service_type.in_({service_type for _, service_type in keys}),
+        ServiceSlot.day.in_({day for day, _ in keys})
+    ))
+    db.session.rollback()
+    for day, service_type in keys - existing:
+        create_slot(day, service_type)
+
+
+def insert_services(values_list):
+    ensure_slots(values_list)
+    connection = bind_connection(ServiceSlot)
+    orders = []
+    for values in values_list:
+        reserved = reserve_slot(connection, values["service_date"], values["service_type"])
+        orders.append(ServiceOrder(**values) if reserved else None)
+    return orders
+
+
+def insert_messages(values_list):
+    return [ContactMessage(**values) for values in values_list]
+
+
+def after_messages(saved):
+    items = [(row_id, values["message"]) for row_id, values in saved]
+    if SENTIMENT_ASYNC:
+        items = [item for item in items if not sentiment_worker.submit(item)]
+    if items:
+        classify_messages(items)
+
+
+WRITE_KINDS = {
+    "service": (insert_services, lambda saved: roll_up_new_orders()),
+    "contact": (insert_messages, after_messages),
+}
+
+
+def commit_writes(kind, items):
+    """Insert one kind's rows in a single transaction and resolve their tickets.
+
+    A failed batch is retried row by row so one bad row fails only its own ticket.
+    """
+    build, after = WRITE_KINDS[kind]
+    try:
+        rows = build([values for values, _ in items])
+        db.session.add_all([row for row in rows if row is not None])
+        db.session.flush()
+        ids = [row.id if row is not None else None for row in rows]
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if len(items) == 1:
+            items[0][1].resolve(error=e)
+            print(f"❌ Write-behind {kind} insert failed:", e)
+            return
+        for item in items:
+            commit_writes(kind, [item])
+        return
+    for (_, ticket), row_id in zip(items, ids):
+        ticket.resolve(row_id)
+    if after:
+        try:
+            after([(row_id, values) for (values, _), row_id in zip(items, ids) if row_id is not None])
+        except Exception as e:
+            print(f"❌ Write-behind {kind} follow-up failed:", e)
+
+
+def write_batch(items):
+    """Writer handler: items are (kind, values, ticket)."""
+    with app.app_context():
+        try:
+            # Items whose request gave up waiting (and cancelled) are skipped
+            claimed = [(k, values, ticket) for k, values, ticket in items if ticket.claim()]
+            for kind in WRITE_KINDS:
+                group = [(values, ticket) for k, values, ticket in claimed if k == kind]
+                if group:
+                    commit_writes(kind, group)
+        finally:
+            for _, _, ticket in items:
+                if not ticket.wait(0):
+                    ticket.resolve(error=RuntimeError("write-behind batch aborted"))
+
+
+write_worker = BatchWorker(
+    "writes", write_batch,
+    max_queue=int(os.environ.get("WRITE_BEHIND_QUEUE", 5000)),
+    batch_size=int(os.environ.get("WRITE_BEHIND_BATCH", 100)),
+    max_wait=int(os.environ.get("WRITE_BEHIND_WAIT_MS", 5)) / 1000
+)
+BACKGROUND_WORKERS["writes"] = write_worker
+
+
+def write_behind(kind, values):
+    """Queue one insert; None when write-behind is off or the queue stayed full."""
+    if not WRITE_BEHIND:
+        return None
+    ticket = Ticket()
+    if not write_worker.submit((kind, values, ticket), block=True, timeout=WRITE_BEHIND_BLOCK_MS / 1000):
+        return None
+    return ticket
+
+
+def await_write(ticket):
+    """Wait for a queued write: "done", "failed", "cancelled" or "pending".
+
+    On timeout the ticket is cancelled so the writer skips it and the
+    caller may safely ask for a retry. If the writer already holds it, the
+    commit in progress gets one more timeout; "pending" means it may still
+    land, so the caller must not invite a retry.
+    """
+    if not ticket.wait(WRITE_BEHIND_ACK_TIMEOUT):
+        if ticket.cancel():
+            return "cancelled"
+        if not ticket.wait(WRITE_BEHIND_ACK_TIMEOUT):
+            return "pending"
+    return "failed" if ticket.error else "done"
+
+
+# ---------- WORKER START-UP ----------
+# Importing the app starts no threads (CLI commands, benchmark.py and the
+# serve.py launcher only need the models and the database). The serving
+# process starts them on its first request, or at startup from the ASGI
+# lifespan / gunicorn post_worker_init hook (serve.py), which also re-queue
+# pending messages in one worker.
+_workers_started = False
+_workers_lock = threading.Lock()
+
+
+def start_background_workers():
+    global _workers_started
+    if _workers_started:
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        image_worker.start()
+        atexit.register(image_worker.stop)
+        chat_worker.start()
+        atexit.register(chat_worker.stop)
+        if SENTIMENT_ASYNC:
+            sentiment_worker.start()
+            atexit.register(sentiment_worker.stop)
+        if WRITE_BEHIND:
+            write_worker.start()
+            # Registered after the sentiment worker, so it is stopped (and drained) first
+            atexit.register(write_worker.stop, timeout=30)
+        _workers_started = True
+
+
+@app.before_request
+def ensure_background_workers():
+    start_background_workers()
+
+
+metrics.gauge(
+    "background_queue_depth", "Items waiting in each background worker queue", ("worker",),
+    collect=lambda: {(name,): w.stats()["depth"] for name, w in BACKGROUND_WORKERS.items()})
+metrics.gauge(
+    "background_queue_lag_ms", "Age of the oldest queued item", ("worker",),
+    collect=lambda: {(name,): w.stats()["lag_ms"] for name, w in BACKGROUND_WORKERS.items()})
+metrics.gauge(
+    "faq_answer_cache_hits", "Answer cache hits/misses", ("result",),
+    collect=lambda: {("hit",): answer_cache.hits, ("miss",): answer_cache.misses})
+
+
+@app.route("/api/models")
+def api_models():
+    return jsonify(ml_models.status())
+
+
+@app.route("/api/queues")
+def api_queues():
+    return jsonify({name: worker.stats() for name, worker in BACKGROUND_WORKERS.items()})
+
+
+@app.route("/api/sentiment/batch", methods=["POST"])
+@admin_required
+def api_sentiment_batch():
+    payload = request.get_json(silent=True)
+    messages = payload.get("messages") if isinstance(payload, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "Expected a non-empty 'messages' list"}), 400
+    if len(messages) > SENTIMENT_BATCH_LIMIT:
+        return jsonify({"error": f"At most {SENTIMENT_BATCH_LIMIT} messages per request"}), 400
+
+    results = get_sentiments(messages)
+    return jsonify({"results": [
+        {"sentiment": label, "confidence": score} for label, score in results
+    ]})
 
 @app.route("/contact", methods=["GET", "POST"])
 def contact():
@@ -445,23 +2599,21 @@ def contact():
         email = request.form.get("email")
         message = request.form.get("message")
 
-        print("Received:", name, email, message)
+        # Save first; the sentiment is filled in by the background worker
+        values = dict(name=name, email=email, message=message, sentiment=SENTIMENT_PENDING)
+        ticket = write_behind("contact", values)
+        if ticket is None:
+            new_msg = ContactMessage(**values)
+            db.session.add(new_msg)
+            db.session.commit()
+
+            # Queue full (or async disabled): classify inline instead of dropping it
+            if not (SENTIMENT_ASYNC and sentiment_worker.submit((new_msg.id, message))):
+                classify_messages([(new_msg.id, message)])
+        elif WRITE_BEHIND_ACK == "commit" and await_write(ticket) in ("failed", "cancelled"):
+            flash("❌ Your message could not be sent right now. Please try again.", "danger")
+            return render_template("contact.html"), 503
 
-        # Vectorize + Predict sentiment
-        prediction = get_sentiment(message)
-        print("Predicted sentiment:", prediction)  # 🔹 Debug
-
-        # Save to DB
-        new_msg = ContactMessage(
-            name=name,
-            email=email,
-            message=message,
-            sentiment=prediction
-        )
-        db.session.add(new_msg)
-        db.session.commit()
-
-        print("Saved to DB ✅")  # 🔹 Debug
         flash("✅ Your message has been sent successfully!", "success")
         return render_template("thank.html")
 
@@ -471,17 +2623,30 @@ def contact():
 
 @app.route("/about")
 def about():
-    return render_template("about.html")
+    return render_cached_page("about.html")
 
 @app.route("/thank-you")
 def thank_you():
     return render_template("thank_you.html")
 
 # ---------- USER MESSAGES MANAGEMENT ----------
+USER_MESSAGES_PER_PAGE = 50
+
+
 @app.route("/user_message")
 def user_message():
-    messages = ContactMessage.query.order_by(ContactMessage.id.desc()).all()
-    return render_template("user_message.html", messages=messages)
+    # One keyset page at a time, newest first; full history via /admin/export/messages
+    before = request.args.get("before", type=int)
+    query = ContactMessage.query
+    if before:
+        query = query.filter(ContactMessage.id < before)
+    rows = query.order_by(ContactMessage.id.desc()).limit(USER_MESSAGES_PER_PAGE + 1).all()
+    messages = rows[:USER_MESSAGES_PER_PAGE]
+    next_before = messages[-1].id if len(rows) > USER_MESSAGES_PER_PAGE else None
+    today = sentiment_bucket(datetime.now(), "day")
+    mood = sentiment_trend_series("day", today - timedelta(days=6), today)
+    return render_template("user_message.html", messages=messages, mood=mood,
+                           next_before=next_before, is_first_page=before is None)
 
 
 @app.route("/delete_message/<int:msg_id>", methods=["POST"])
@@ -493,9 +2658,25 @@ def delete_message(msg_id):
     flash("Message deleted successfully!", "success")
     return redirect(url_for("user_message"))
 
+@app.route("/label_message/<int:msg_id>", methods=["POST"])
+def label_message(msg_id):
+    msg = ContactMessage.query.get_or_404(msg_id)
+    label = request.form.get("label")
+    if label not in training.SENTIMENT_CLASSES:
+        flash("❌ Unknown sentiment label", "danger")
+        return redirect(url_for("user_message"))
+    msg.label = label
+    db.session.commit()
+    flash("✅ Sentiment label saved", "success")
+    return redirect(url_for("user_message"))
+
 @app.route("/thank")
 def thank():
     return render_template("thank")
 # ----------------- RUN -----------------
 if __name__ == "__main__":
+    # Development server; production runs through serve.py (gunicorn / uvicorn)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # Only in the reloader's serving child, not in the watcher process
+        requeue_pending_messages()
     app.run(debug=True)
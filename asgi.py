@@ -0,0 +1,316 @@
+"""ASGI entry point: async chat/inference endpoints in front of the Flask app.
+
+    python serve.py --asgi --workers 4          # or: uvicorn asgi:application
+
+The chatbot and sentiment JSON endpoints are answered on the event loop,
+with the model inference itself (faq_model / naive_bayes_model, which are
+CPU-bound and release the GIL inside numpy/scipy) dispatched to a small
+bounded thread pool. A waiting chat request is then just a suspended
+coroutine rather than a pinned thread, so one process can keep thousands
+of them open. Every other route (pages, /api/products, admin, uploads) is
+passed to the unchanged Flask app through a WSGI bridge that runs it on a
+second bounded pool and streams its response chunk by chunk.
+
+The chat widget keeps a WebSocket open on /ws/chat instead of POSTing
+every message. Each message is answered as soon as its micro-batch
+(app.chat_worker, shared by all connected sessions) comes back, and the
+session's previous question is kept as context for follow-ups.
+
+Pool sizes come from INFERENCE_THREADS and WSGI_THREADS.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import unquote
+
+import app as shop
+
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", min(4, os.cpu_count() or 1)))
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 32))
+# Request bodies above this are spooled to disk (product imports, uploads)
+SPOOL_BYTES = 1024 * 1024
+
+inference_pool = ThreadPoolExecutor(INFERENCE_THREADS, thread_name_prefix="inference")
+wsgi_pool = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="wsgi")
+# Callers beyond the pool size wait on the event loop instead of piling
+# up in the executor's unbounded work queue
+inference_slots = asyncio.Semaphore(INFERENCE_THREADS)
+
+
+async def run_inference(func, *args):
+    async with inference_slots:
+        return await asyncio.get_running_loop().run_in_executor(inference_pool, func, *args)
+
+
+# ---------- native async endpoints ----------
+async def get_answer(payload):
+    message = payload.get("message", "") if isinstance(payload, dict) else ""
+    return 200, {"answer": await run_inference(shop.get_answer, message)}
+
+
+async def sentiment_batch(payload):
+    messages = payload.get("messages") if isinstance(payload, dict) else None
+    if not isinstance(messages, list) or not messages:
+        return 400, {"error": "Expected a non-empty 'messages' list"}
+    if len(messages) > shop.SENTIMENT_BATCH_LIMIT:
+        return 400, {"error": f"At most {shop.SENTIMENT_BATCH_LIMIT} messages per request"}
+
+    results = await run_inference(shop.get_sentiments, messages)
+    return 200, {"results": [
+        {"sentiment": label, "confidence": score} for label, score in results
+    ]}
+
+
+ASYNC_ROUTES = {
+    ("POST", "/get_answer"): get_answer,
+    ("POST", "/api/sentiment/batch"): sentiment_batch,
+}
+# Same rule as app.admin_required on the Flask side
+ADMIN_ROUTES = {("POST", "/api/sentiment/batch")}
+
+
+def admin_session(scope):
+    """True when the request carries a valid Flask session cookie with is_admin set."""
+    cookies = SimpleCookie()
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+    morsel = cookies.get(shop.app.config["SESSION_COOKIE_NAME"])
+    serializer = shop.app.session_interface.get_signing_serializer(shop.app)
+    if morsel is None or serializer is None:
+        return False
+    try:
+        data = serializer.loads(morsel.value,
+                                max_age=int(shop.app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return False
+    return isinstance(data, dict) and bool(data.get("is_admin"))
+
+
+async def read_body(receive, limit=None):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunks.append(message.get("body", b""))
+        size += len(chunks[-1])
+        if limit is not None and size > limit:
+            return None
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def handle_async(handler, scope, receive, send):
+    started = time.perf_counter()
+    body = await read_body(receive, limit=shop.app.config.get("MAX_CONTENT_LENGTH"))
+    if body is None:
+        status, payload = 413, {"error": "Request body too large"}
+    else:
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            payload = None
+        status, payload = await handler(payload)
+    await send_json(send, status, payload)
+
+    # Same series the Flask after_request hook records
+    shop.REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=scope["path"], method=scope["method"])
+    shop.REQUEST_COUNT.inc(endpoint=scope["path"], method=scope["method"], status=status)
+
+
+# ---------- WSGI bridge for everything else ----------
+def wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": unquote(scope["path"]).encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def spool_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            return None
+        body.write(message.get("body", b""))
+        if not message.get("more_body"):
+            body.seek(0)
+            return body
+
+
+async def handle_wsgi(scope, receive, send):
+    body = await spool_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = int(status.split(" ", 1)[0])
+        response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    async def start():
+        await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+
+    # The app call and every next()/close() may land on different pool
+    # threads; running them all in one copied context keeps the Flask
+    # contexts that stream_with_context pushed visible to the generator
+    context = contextvars.copy_context()
+    try:
+        result = await loop.run_in_executor(wsgi_pool, context.run, shop.app, wsgi_environ(scope, body), start_response)
+        chunks = iter(result)
+        started = False
+        try:
+            # Pull one chunk at a time so streamed exports never sit in memory whole
+            while (chunk := await loop.run_in_executor(wsgi_pool, context.run, next, chunks, None)) is not None:
+                if not chunk:
+                    continue
+                if not started:
+                    await start()
+                    started = True
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(wsgi_pool, context.run, result.close)
+        if not started:
+            await start()
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        body.close()
+
+
+# ---------- chat socket ----------
+CHAT_MAX_MESSAGE = 1000     # characters
+
+
+async def ask(message, previous):
+    loop = asyncio.get_running_loop()
+    reply = loop.create_future()
+
+    def deliver(answer):
+        loop.call_soon_threadsafe(lambda: reply.done() or reply.set_result(answer))
+
+    if not shop.chat_worker.submit((message, previous, deliver)):
+        # Batch queue full: answer this one on the inference pool instead
+        return (await run_inference(shop.answer_chat_turns, [(message, previous)]))[0]
+    return await reply
+
+
+async def chat_socket(scope, receive, send):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+
+    send_lock = asyncio.Lock()
+    pending = set()
+    previous = None
+
+    async def reply(msg_id, text, prev):
+        started = time.perf_counter()
+        answer = await ask(text, prev)
+        async with send_lock:
+            await send({"type": "websocket.send", "text": json.dumps({"id": msg_id, "answer": answer})})
+        shop.REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=scope["path"], method="WS")
+
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message["type"] != "websocket.receive":
+                continue
+            raw = message.get("text") or (message.get("bytes") or b"").decode("utf-8", "replace")
+            try:
+                payload = json.loads(raw)
+            except ValueError:
+                payload = {"message": raw}
+            if not isinstance(payload, dict):
+                payload = {"message": str(payload)}
+            text = str(payload.get("message", ""))[:CHAT_MAX_MESSAGE]
+
+            # Answers are pushed as they are ready; "id" lets the client match them up
+            task = asyncio.create_task(reply(payload.get("id"), text, previous))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            previous = text
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+# ---------- application ----------
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                shop.start_background_workers()
+                shop.requeue_pending_messages()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                inference_pool.shutdown(wait=False)
+                wsgi_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] == "websocket":
+        if scope["path"] == "/ws/chat":
+            await chat_socket(scope, receive, send)
+        else:
+            await send({"type": "websocket.close", "code": 4404})
+        return
+    if scope["type"] != "http":
+        return
+
+    handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is not None:
+        if (scope["method"], scope["path"]) in ADMIN_ROUTES and not admin_session(scope):
+            await send_json(send, 403, {"error": "Admin login required"})
+            return
+        await handle_async(handler, scope, receive, send)
+    else:
+        await handle_wsgi(scope, receive, send)
@@ -0,0 +1,398 @@
+"""Load test for the hot endpoints.
+
+Seeds synthetic products, service orders and contact messages into
+throwaway databases, then drives the endpoints below through the Flask
+test client and through a few local server processes, and prints the
+latency percentiles, throughput and peak memory as JSON:
+
+    python benchmark.py --scale 100k --requests 500 -o bench.json
+    python benchmark.py --scale 1m --db-dir /tmp/bench-1m      # seed once, reuse
+    SENTIMENT_ASYNC=0 python benchmark.py --mode client        # compare modes
+    WRITE_BEHIND=1 python benchmark.py --endpoints contact,services
+
+Everything the app reads from the environment (DATABASE_URL, SQLITE_*,
+DB_POOL_*, SENTIMENT_ASYNC, ...) applies as usual, so two runs with
+different settings can be diffed directly. Run it from the repository root
+so the models/ and data/ directories are found.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+CATEGORIES = ["Air Conditioner", "Refrigerator", "Washing Machine", "Television", "Water Purifier", "Geyser"]
+SERVICE_TYPES = ["Installation", "Repair", "Maintenance", "Uninstallation"]
+QUESTIONS = [
+    "what is your contact number", "how do I book a service", "do you offer installation",
+    "what are your working hours", "where are you located", "is there a warranty",
+]
+MESSAGES = [
+    "Great service, the technician was on time", "The installation was terrible and late",
+    "Okay experience, nothing special", "Very happy with the new fridge", "Still waiting for a refund",
+]
+SEED_CHUNK = 10_000
+
+
+def parse_scale(value):
+    """'1k' -> 1000, '100k' -> 100000, '1m' -> 1000000."""
+    value = value.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, wall_seconds, errors):
+    latencies = sorted(latencies)
+    ms = lambda s: round(s * 1000, 3) if s is not None else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(statistics.fmean(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall_seconds, 1) if wall_seconds else None,
+    }
+
+
+def point_env_at(db_dir):
+    """Send every bind to SQLite files in db_dir (unless the caller set URLs)."""
+    # Measure booking throughput, not "fully booked" rejections
+    os.environ.setdefault("SERVICE_DAILY_CAPACITY", "1000000")
+    if os.environ.get("DATABASE_URL"):
+        return
+    for key, filename in (("ORDERS", "user.db"), ("PRODUCTS", "products.db"),
+                          ("SERVICES", "services.db"), ("ORDER", "order.db")):
+        os.environ.setdefault(f"DATABASE_URL_{key}", f"sqlite:///{os.path.join(db_dir, filename)}")
+
+
+# ---------- seeding ----------
+def seed(products, orders, messages, rng):
+    """Bulk-insert synthetic rows, keeping the dashboard counters in step."""
+    from sqlalchemy import insert
+    import app as shop
+
+    with shop.app.app_context():
+        db = shop.db
+        have = {
+            "products": shop.Product.query.count(),
+            "orders": shop.ServiceOrder.query.count(),
+            "messages": shop.ContactMessage.query.count(),
+        }
+
+        # Products go through the regular bulk import path (counters, FTS, catalog version)
+        records = (
+            (i, {
+                "name": f"{rng.choice(CATEGORIES)} model {i}",
+                "category": rng.choice(CATEGORIES),
+                "price": round(rng.uniform(2_000, 60_000), 2),
+                "description": f"Synthetic product {i} for load testing",
+            })
+            for i in range(have["products"], products)
+        )
+        shop.import_products(records, chunk_size=SEED_CHUNK)
+        product_count = max(products, have["products"])
+
+        start = date(2024, 1, 1)
+        services = shop.ServiceOrder.__table__
+        for offset in range(have["orders"], orders, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(offset + SEED_CHUNK, orders)):
+                day = start + timedelta(days=rng.randrange(730))
+                rows.append({
+                    "name": f"Customer {i}", "phone": f"98{i:08d}"[:10],
+                    "service_type": rng.choice(SERVICE_TYPES),
+                    "date": day.isoformat(), "service_date": day,
+                    "address": f"{i} Benchmark Road",
+                    "product_name": f"Product {i}", "price": round(rng.uniform(200, 5_000), 2),
+                    "product_id": rng.randint(1, product_count) if product_count else None,
+                })
+            connection = db.session.connection(bind_arguments={"bind": db.engines[shop.ServiceOrder.__bind_key__]})
+            connection.execute(insert(services), rows)
+            shop.bump_service_stats(connection, len(rows), sum(r["price"] for r in rows))
+            db.session.commit()
+
+        contact = shop.ContactMessage.__table__
+        for offset in range(have["messages"], messages, SEED_CHUNK):
+            rows = [{
+                "name": f"Visitor {i}", "email": f"visitor{i}@example.com",
+                "message": rng.choice(MESSAGES),
+                "sentiment": rng.choice(["positive", "neutral", "negative"]),
+                "sentiment_score": round(rng.uniform(0.4, 1.0), 4),
+            } for i in range(offset, min(offset + SEED_CHUNK, messages))]
+            db.session.connection(bind_arguments={"bind": db.engines[shop.ContactMessage.__bind_key__]}) \
+                .execute(insert(contact), rows)
+            db.session.commit()
+
+        return {
+            "products": shop.Product.query.count(),
+            "orders": shop.ServiceOrder.query.count(),
+            "messages": shop.ContactMessage.query.count(),
+        }
+
+
+# ---------- scenarios ----------
+def scenarios(rng):
+    """(name, method, path, form, json) request factories, one per hot endpoint."""
+    def order_form():
+        return {
+            "name": "Bench", "phone": "9800000000", "service": rng.choice(SERVICE_TYPES),
+            "date": (date.today() + timedelta(days=rng.randrange(1, 60))).isoformat(),
+            "address": "1 Benchmark Road", "product_name": "Bench product",
+            "product_price": str(rng.randint(200, 5_000)),
+        }
+
+    return {
+        "api_products": lambda: ("GET", "/api/products", None, None),
+        "api_products_category": lambda: (
+            "GET", "/api/products?" + urllib.parse.urlencode({"category": rng.choice(CATEGORIES), "sort": "price_asc"}),
+            None, None),
+        "admin": lambda: ("GET", "/admin", None, None),
+        "get_answer": lambda: ("POST", "/get_answer", None, {"message": rng.choice(QUESTIONS)}),
+        "contact": lambda: ("POST", "/contact", {
+            "name": "Bench", "email": "bench@example.com", "message": rng.choice(MESSAGES)}, None),
+        "services": lambda: ("POST", "/services", order_form(), None),
+    }
+
+
+def run_client(names, requests_per_endpoint, warmup, rng):
+    """Sequential requests through the Flask test client (no network, no server)."""
+    import app as shop
+
+    client = shop.app.test_client()
+    makers = scenarios(rng)
+    results = {}
+    for name in names:
+        for _ in range(warmup):
+            method, path, form, body = makers[name]()
+            client.open(path, method=method, data=form, json=body)
+
+        tracemalloc.start()
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(requests_per_endpoint):
+            method, path, form, body = makers[name]()
+            t0 = time.perf_counter()
+            response = client.open(path, method=method, data=form, json=body)
+            response.get_data()
+            latencies.append(time.perf_counter() - t0)
+            errors += response.status_code >= 400
+        wall = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[name] = summarize(latencies, wall, errors)
+        results[name]["peak_alloc_mb"] = round(peak / 2 ** 20, 2)
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_servers(workers):
+    """Start `workers` threaded server processes; returns [(process, base_url)]."""
+    servers = []
+    for _ in range(workers):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, __file__, "serve", "--port", str(port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        servers.append((process, f"http://127.0.0.1:{port}"))
+
+    deadline = time.monotonic() + 60
+    for process, url in servers:
+        while True:
+            try:
+                urllib.request.urlopen(url + "/api/models", timeout=1).read()
+                break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                if process.poll() is not None or time.monotonic() > deadline:
+                    stop_servers(servers)
+                    raise RuntimeError("benchmark server failed to start")
+                time.sleep(0.2)
+    return servers
+
+
+def peak_rss_mb(pid):
+    # Linux only; VmHWM is the process's resident-set high-water mark
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def stop_servers(servers):
+    for process, _ in servers:
+        process.terminate()
+    for process, _ in servers:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def http_request(base_url, method, path, form, body):
+    headers = {}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    elif form is not None:
+        data = urllib.parse.urlencode(form).encode()
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    request = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run_server(names, requests_per_endpoint, warmup, workers, concurrency, rng):
+    """Concurrent requests over HTTP, spread round-robin across worker processes."""
+    servers = start_servers(workers)
+    makers = scenarios(rng)
+    lock = threading.Lock()
+    results = {}
+    try:
+        for name in names:
+            # Build the requests up front so the shared RNG is not used across threads
+            plan = [makers[name]() for _ in range(warmup + requests_per_endpoint)]
+            for i, (method, path, form, body) in enumerate(plan[:warmup]):
+                http_request(servers[i % workers][1], method, path, form, body)
+
+            latencies, errors = [], 0
+
+            def one(i):
+                nonlocal errors
+                method, path, form, body = plan[warmup + i]
+                t0 = time.perf_counter()
+                try:
+                    status = http_request(servers[i % workers][1], method, path, form, body)
+                except OSError:
+                    status = 599
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    errors += status >= 400
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(one, range(requests_per_endpoint)))
+            results[name] = summarize(latencies, time.perf_counter() - started, errors)
+        results["server_peak_rss_mb"] = [peak_rss_mb(process.pid) for process, _ in servers]
+    finally:
+        stop_servers(servers)
+    return results
+
+
+def serve(port):
+    from werkzeug.serving import run_simple
+    import app as shop
+
+    run_simple("127.0.0.1", port, shop.app, threaded=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command")
+    serve_parser = sub.add_parser("serve", help="(internal) run one benchmark server process")
+    serve_parser.add_argument("--port", type=int, required=True)
+
+    parser.add_argument("--scale", default="1k", help="rows per table, e.g. 1k, 100k, 1m (default 1k)")
+    parser.add_argument("--products", help="override --scale for products")
+    parser.add_argument("--orders", help="override --scale for service orders")
+    parser.add_argument("--messages", help="override --scale for contact messages")
+    parser.add_argument("--db-dir", help="directory for the SQLite files (kept, and reused on the next run)")
+    parser.add_argument("--mode", choices=("client", "server", "both"), default="both")
+    parser.add_argument("--endpoints", help="comma-separated subset of: " + ", ".join(scenarios(random.Random())))
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4, help="server processes in server mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads in server mode")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        return serve(args.port)
+
+    db_dir = args.db_dir or tempfile.mkdtemp(prefix="shop-bench-")
+    os.makedirs(db_dir, exist_ok=True)
+    point_env_at(db_dir)
+
+    rng = random.Random(args.seed)
+    names = args.endpoints.split(",") if args.endpoints else list(scenarios(rng))
+    unknown = set(names) - set(scenarios(rng))
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    # The app prints model loads and worker errors; keep them on stderr so
+    # stdout carries only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        scale = parse_scale(args.scale)
+        started = time.perf_counter()
+        rows = seed(
+            parse_scale(args.products) if args.products else scale,
+            parse_scale(args.orders) if args.orders else scale,
+            parse_scale(args.messages) if args.messages else scale,
+            rng,
+        )
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "db_dir": db_dir,
+            "rows": rows,
+            "seed_seconds": round(time.perf_counter() - started, 2),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("command", "output", "port")},
+            "env": {k: v for k, v in os.environ.items() if k.startswith(("DATABASE_URL", "SQLITE_", "DB_POOL", "SENTIMENT_", "WRITE_BEHIND", "SERVICE_"))},
+        }
+
+        if args.mode in ("client", "both"):
+            report["test_client"] = run_client(names, args.requests, args.warmup, rng)
+        if args.mode in ("server", "both"):
+            report["server"] = run_server(names, args.requests, args.warmup, args.workers, args.concurrency, rng)
+    # KiB on Linux
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Streaming readers and writers for bulk CSV / JSON Lines transfers.
+
+Everything here works on iterators so that importing or exporting a large
+table never holds more than one chunk in memory.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+FORMATS = ("csv", "jsonl")
+FORMAT_ALIASES = {"ndjson": "jsonl", "json": "jsonl"}
+MIMETYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def resolve_format(name):
+    """Canonical format name, or None if it is not supported."""
+    name = FORMAT_ALIASES.get((name or "").lower(), (name or "").lower())
+    return name if name in FORMATS else None
+
+
+def detect_format(filename, default="csv"):
+    ext = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    if ext in ("jsonl", "ndjson"):
+        return "jsonl"
+    if ext == "csv":
+        return "csv"
+    return default
+
+
+def read_records(stream, fmt):
+    """Yield (line_number, dict) from a binary CSV or JSON Lines stream."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_serialized(rows, columns, fmt, rows_per_chunk=500):
+    """Yield CSV or NDJSON text for an iterable of row tuples, a chunk at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+            buffer.write("\n")
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
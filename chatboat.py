@@ -1,8 +1,6 @@
 import json
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
-import pickle
+from joblib import load
+from training import build_faq_index, train_faq, LIVE_PATHS
 
 # Load updated FAQ JSON
 with open("data/chat.json", "r") as f:
@@ -10,33 +8,17 @@ with open("data/chat.json", "r") as f:
 
 faqs = data["faq"]
 
-# Prepare training data
-X = []
-y = []
-
-for faq in faqs:
-    for keyword in faq["keywords"]:
-        X.append(keyword.lower())
-        y.append(faq["answer"])
-    # Optional: add natural sentence variations
-    X.append(f"how to reach {faq['keywords'][0]}")
-    y.append(faq["answer"])
-    X.append(f"tell me about {faq['keywords'][0]}")
-    y.append(faq["answer"])
-
-# Train model
-model = Pipeline([
-    ('tfidf', TfidfVectorizer()),
-    ('clf', LogisticRegression(max_iter=200))
-])
-model.fit(X, y)
+# Train, version and publish models/faq_model.pkl (see training.py)
+run = train_faq(faqs)
+# Only entries that changed since the last build are re-vectorized
+index_run = build_faq_index(faqs)
 
 # Test model
+model = load(LIVE_PATHS["faq_model"])
 for q in ["where is your shop", "contact number", "who owns this shop"]:
     print(f"Q: {q} --> A: {model.predict([q])[0]}")
 
-# Save model
-with open("models/faq_model.pkl", "wb") as f:
-    pickle.dump(model, f)
-
-print("Model retrained and saved as faq_model.pkl")
+print(f"Model retrained and saved as faq_model.pkl (v{run['version']}, "
+      f"accuracy {run['accuracy']}, {run['train_seconds']}s)")
+print(f"FAQ index updated (v{index_run['version']}, {index_run['mode']}, "
+      f"{index_run['samples']} entries vectorized)")
@@ -0,0 +1,111 @@
+"""Engine settings for the SQLAlchemy binds used by app.py.
+
+Every bind defaults to its SQLite file but can be pointed at another
+database with an environment variable, without code changes:
+
+    DATABASE_URL_PRODUCTS=postgresql://shop@db/shop
+
+Setting DATABASE_URL instead selects the consolidated schema: every table
+lives in that one database (no binds) and ServiceOrder gets real foreign
+keys to Product and User. `flask consolidate-db` copies existing data over.
+
+Pool sizing is read from DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT,
+optionally per bind (DB_POOL_SIZE_SERVICES=20). SQLite connections get
+WAL journaling and the pragmas below on connect; each pragma can be
+overridden globally (SQLITE_CACHE_SIZE=-131072) or per bind
+(SQLITE_CACHE_SIZE_PRODUCTS=-131072).
+"""
+import os
+
+from sqlalchemy import ForeignKey, event
+
+CONSOLIDATED_URL = os.environ.get("DATABASE_URL")
+
+BIND_URLS = {
+    'orders': 'sqlite:///user.db',        # Users
+    'products': 'sqlite:///products.db',  # Products
+    'services': 'sqlite:///services.db',  # Service orders
+    'order': 'sqlite:///order.db',        # Contact messages
+}
+
+SQLITE_PRAGMAS = {
+    # Readers no longer block on a writer (and vice versa)
+    "journal_mode": "WAL",
+    # Safe with WAL; fsync at checkpoints instead of every commit
+    "synchronous": "NORMAL",
+    # Wait for a lock instead of failing with "database is locked" (ms)
+    "busy_timeout": 5000,
+    # Memory-map up to 256 MB of the file
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative = KiB, i.e. 64 MB page cache per connection
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    # Enforce the consolidated schema's foreign keys
+    "foreign_keys": "ON",
+}
+
+
+def bind_key(key):
+    """__bind_key__ for a model: None (the single database) when consolidated."""
+    return None if CONSOLIDATED_URL else key
+
+
+def foreign_key(target, **kwargs):
+    """ForeignKey args for a column; only real constraints in the consolidated schema.
+
+    With separate databases the column is a plain (indexed) id reference,
+    since SQLite cannot enforce keys across files.
+    """
+    return [ForeignKey(target, **kwargs)] if CONSOLIDATED_URL else []
+
+
+def _setting(env, name, key, default):
+    if key is None:
+        return env.get(name, default)
+    return env.get(f"{name}_{key.upper()}", env.get(name, default))
+
+
+def bind_url(key, env=os.environ):
+    if key is None:
+        return env["DATABASE_URL"]
+    return env.get(f"DATABASE_URL_{key.upper()}", BIND_URLS[key])
+
+
+def sqlite_pragmas(key, env=os.environ):
+    return {
+        pragma: _setting(env, f"SQLITE_{pragma.upper()}", key, value)
+        for pragma, value in SQLITE_PRAGMAS.items()
+    }
+
+
+def engine_options(key, env=os.environ):
+    """Value for app.config['SQLALCHEMY_BINDS'][key] (key None: the consolidated database)."""
+    url = bind_url(key, env)
+    options = {
+        "url": url,
+        "pool_size": int(_setting(env, "DB_POOL_SIZE", key, 5)),
+        "max_overflow": int(_setting(env, "DB_MAX_OVERFLOW", key, 10)),
+        "pool_timeout": float(_setting(env, "DB_POOL_TIMEOUT", key, 30)),
+    }
+    if url.startswith("sqlite"):
+        busy_ms = float(sqlite_pragmas(key, env)["busy_timeout"])
+        # Pooled connections are shared across request threads
+        options["connect_args"] = {"timeout": busy_ms / 1000, "check_same_thread": False}
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = int(_setting(env, "DB_POOL_RECYCLE", key, 1800))
+    return options
+
+
+def configure_engine(key, engine, env=os.environ):
+    """Apply the SQLite pragmas to every new connection of a bind's engine."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(key, env)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
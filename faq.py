@@ -0,0 +1,179 @@
+"""Helpers for the FAQ chatbot in app.py."""
+import hashlib
+import json
+import re
+from collections import deque
+
+import numpy as np
+
+
+def normalize_question(text):
+    """Lower-case and collapse whitespace so equivalent inputs share a cache key."""
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower()
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over every FAQ keyword.
+
+    `find(text)` returns the index of the first FAQ (in chat.json order)
+    that has any keyword occurring as a substring of `text`, or None -- the
+    same answer as looping over faqs and keywords, in a single pass over
+    the input regardless of how many keywords there are.
+    """
+
+    def __init__(self, faqs):
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [None]   # lowest FAQ index ending at (or suffix-linked from) this state
+
+        for index, faq in enumerate(faqs):
+            for keyword in faq.get("keywords", []):
+                keyword = keyword.lower()
+                if keyword:
+                    self._add(keyword, index)
+        self._link()
+
+    def _add(self, keyword, index):
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+            state = nxt
+        if self._best[state] is None or index < self._best[state]:
+            self._best[state] = index
+
+    def _link(self):
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                inherited = self._best[self._fail[nxt]]
+                if inherited is not None and (self._best[nxt] is None or inherited < self._best[nxt]):
+                    self._best[nxt] = inherited
+                pending.append(nxt)
+
+    def find(self, text):
+        best = None
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            hit = self._best[state]
+            if hit is not None and (best is None or hit < best):
+                best = hit
+                if best == 0:
+                    break
+        return best
+
+
+class FaqIndex:
+    """Precomputed vector index for answering FAQ questions by similarity.
+
+    Every phrasing of every entry (each keyword, plus all keywords joined)
+    becomes one L2-normalized row of a sparse CSR matrix, built with a
+    stateless character n-gram HashingVectorizer. A question is answered
+    with one sparse matrix-vector product and a top-k over the entries.
+    Because hashing needs no fitted vocabulary, `build()` can reuse the
+    rows of entries that did not change since the previous index and only
+    vectorize new or edited ones.
+    """
+
+    def __init__(self, vectorizer, matrix, entry_offsets, answers, fingerprints):
+        self.vectorizer = vectorizer
+        self.matrix = matrix                  # (phrasings x features), float32 CSR
+        self.entry_offsets = entry_offsets    # rows of entry i: offsets[i]:offsets[i + 1]
+        self.answers = answers
+        self.fingerprints = fingerprints
+
+    @staticmethod
+    def new_vectorizer():
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        return HashingVectorizer(
+            analyzer="char_wb", ngram_range=(2, 4), n_features=2 ** 18,
+            alternate_sign=False, norm="l2", dtype=np.float32,
+        )
+
+    @staticmethod
+    def fingerprint(entry):
+        raw = json.dumps([entry.get("keywords", []), entry.get("answer", "")], sort_keys=True)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @staticmethod
+    def phrasings(entry):
+        keywords = [normalize_question(k) for k in entry.get("keywords", []) if k]
+        if not keywords:
+            # Every entry needs at least one row
+            return [normalize_question(entry.get("answer", ""))]
+        return keywords + [" ".join(keywords)] if len(keywords) > 1 else keywords
+
+    @classmethod
+    def build(cls, faqs, previous=None):
+        """Index `faqs`, reusing rows from `previous` for unchanged entries.
+
+        Returns (index, number of entries that had to be vectorized).
+        """
+        from scipy import sparse
+
+        vectorizer = cls.new_vectorizer()
+        reusable = {}
+        if previous is not None and previous.vectorizer.get_params() == vectorizer.get_params():
+            for i, fp in enumerate(previous.fingerprints):
+                reusable[fp] = (previous.entry_offsets[i], previous.entry_offsets[i + 1])
+
+        blocks, offsets, fingerprints, fresh_texts, fresh_slots = [], [0], [], [], []
+        for entry in faqs:
+            fp = cls.fingerprint(entry)
+            fingerprints.append(fp)
+            if fp in reusable:
+                start, end = reusable[fp]
+                blocks.append(previous.matrix[start:end])
+                rows = end - start
+            else:
+                texts = cls.phrasings(entry)
+                fresh_slots.append((len(blocks), len(fresh_texts), len(fresh_texts) + len(texts)))
+                fresh_texts.extend(texts)
+                blocks.append(None)
+                rows = len(texts)
+            offsets.append(offsets[-1] + rows)
+
+        if fresh_texts:
+            # One transform call for everything that changed
+            fresh = vectorizer.transform(fresh_texts)
+            for slot, start, end in fresh_slots:
+                blocks[slot] = fresh[start:end]
+
+        matrix = (sparse.vstack(blocks, format="csr", dtype=np.float32) if blocks
+                  else sparse.csr_matrix((0, vectorizer.n_features), dtype=np.float32))
+        index = cls(vectorizer, matrix, np.asarray(offsets, dtype=np.int64),
+                    [entry["answer"] for entry in faqs], fingerprints)
+        return index, len(fresh_slots)
+
+    def search_many(self, questions, k=1):
+        """Top-k (entry, score) pairs per question, best first."""
+        if not self.answers:
+            return [[] for _ in questions]
+        queries = self.vectorizer.transform([normalize_question(q) for q in questions])
+        # (phrasings x questions) cosine similarities, then best phrasing per entry
+        scores = (self.matrix @ queries.T).toarray()
+        per_entry = np.maximum.reduceat(scores, self.entry_offsets[:-1], axis=0)
+        results = []
+        for column in per_entry.T:
+            k_ = min(k, len(column))
+            top = np.argpartition(-column, k_ - 1)[:k_]
+            top = top[np.argsort(-column[top])]
+            results.append([(int(i), float(column[i])) for i in top])
+        return results
+
+    def search(self, question, k=1):
+        return self.search_many([question], k)[0]
@@ -0,0 +1,16 @@
+"""File-system helpers shared by images.py and training.py."""
+import os
+
+
+def default_file_mode():
+    """The mode a plain open() would give a new file under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp creates files as 0600; published files (uploads, image variants,
+# model artifacts) get this mode before they are swapped into place so a
+# front-end server can read them. Read once at import, before any worker
+# threads exist, since probing the umask briefly changes it.
+FILE_MODE = default_file_mode()
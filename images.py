@@ -0,0 +1,87 @@
+"""Product image storage for app.py.
+
+Uploads are stored under the SHA-256 of their content, so the same picture
+uploaded twice is kept once and two different files that happen to share a
+name no longer overwrite each other. Resized variants (WebP at every width
+in VARIANT_WIDTHS plus a thumbnail in the original format) are generated
+next to the original by a background worker; Pillow is optional and when
+it is missing products simply keep serving the original file.
+"""
+import hashlib
+import os
+import tempfile
+
+from fsutil import FILE_MODE
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+VARIANT_WIDTHS = (320, 640)
+THUMBNAIL_WIDTH = 320
+WEBP_QUALITY = 80
+
+
+def store_upload(file_storage, upload_folder):
+    """Save an uploaded file as <sha256>.<ext> and return its path."""
+    ext = file_storage.filename.rsplit(".", 1)[1].lower()
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=upload_folder, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file_storage.stream.read(64 * 1024), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        path = os.path.join(upload_folder, f"{digest.hexdigest()[:32]}.{ext}")
+        if os.path.exists(path):
+            os.remove(tmp)      # identical image already stored
+        else:
+            os.chmod(tmp, FILE_MODE)
+            os.replace(tmp, path)
+        return path
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def variant_path(image_path, width, fmt=None):
+    stem, ext = os.path.splitext(image_path)
+    return f"{stem}-{width}.{fmt or ext.lstrip('.')}"
+
+
+def build_variants(image_path):
+    """Write the resized/WebP variants of an image; returns the widths made."""
+    if Image is None or not image_path or not os.path.exists(image_path):
+        return []
+
+    made = []
+    with Image.open(image_path) as original:
+        original.load()
+        for width in VARIANT_WIDTHS:
+            if width > original.width and made:
+                break   # never upscale; the original already covers this size
+            resized = original.copy()
+            resized.thumbnail((width, width * original.height // max(original.width, 1)))
+            if resized.mode not in ("RGB", "RGBA"):
+                resized = resized.convert("RGBA")
+            _save_atomic(resized, variant_path(image_path, width, "webp"), "WEBP", quality=WEBP_QUALITY)
+            if width == THUMBNAIL_WIDTH:
+                thumb = resized if original.format != "JPEG" else resized.convert("RGB")
+                _save_atomic(thumb, variant_path(image_path, width), original.format or "PNG")
+            made.append(width)
+    return made
+
+
+def _save_atomic(image, path, fmt, **params):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        image.save(tmp, fmt, **params)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
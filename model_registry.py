@@ -0,0 +1,104 @@
+"""Lazy, hot-reloadable access to the pickled models in models/.
+
+Each model is loaded on first use with joblib's mmap mode, so numpy arrays
+saved with joblib.dump are mapped read-only from the page cache and shared
+between pre-forked workers instead of being copied into every process.
+Every `check_interval` seconds a `get()` also stats the file; when a
+retrained artifact has replaced it (trainers write a temp file and
+os.replace it), the new model is loaded next to the old one and swapped in
+under a lock, so callers never see a half-loaded model.
+"""
+import os
+import threading
+import time
+import warnings
+
+from joblib import load
+
+
+class ModelRegistry:
+    def __init__(self, check_interval=2.0, mmap_mode="r"):
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, on_reload=None):
+        """Declare a model; nothing is read from disk until `get(name)`."""
+        self._entries[name] = {
+            "path": path,
+            "model": None,
+            "signature": None,
+            "loaded_at": None,
+            "checked_at": None,
+            "error": None,
+            "reloads": 0,
+            "on_reload": on_reload,
+        }
+
+    def get(self, name):
+        entry = self._entries[name]
+        if self._fresh(entry):
+            return entry["model"]
+
+        with self._lock:
+            if self._fresh(entry):
+                return entry["model"]
+            now = time.monotonic()
+            entry["checked_at"] = now
+            signature = self._signature(entry["path"])
+            if signature is not None and signature != entry["signature"]:
+                self._load(name, entry, signature)
+            return entry["model"]
+
+    def reload(self, name=None):
+        """Force the next `get()` to re-check the given (or every) model."""
+        for key in [name] if name else list(self._entries):
+            self._entries[key]["checked_at"] = None
+            self._entries[key]["signature"] = None
+
+    def status(self):
+        return {
+            name: {
+                "path": e["path"],
+                "loaded": e["model"] is not None,
+                "loaded_at": e["loaded_at"],
+                "reloads": e["reloads"],
+                "error": e["error"],
+            }
+            for name, e in self._entries.items()
+        }
+
+    def _fresh(self, entry):
+        checked = entry["checked_at"]
+        return checked is not None and time.monotonic() - checked < self.check_interval
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _load(self, name, entry, signature):
+        try:
+            with warnings.catch_warnings():
+                # Ignore version mismatch warnings
+                warnings.simplefilter("ignore", category=UserWarning)
+                model = load(entry["path"], mmap_mode=self.mmap_mode)
+        except Exception as e:
+            print(f"❌ Error loading model '{name}':", e)
+            entry["error"] = str(e)
+            return
+
+        replaced = entry["model"] is not None
+        entry["model"] = model
+        entry["signature"] = signature
+        entry["loaded_at"] = time.time()
+        entry["error"] = None
+        if replaced:
+            entry["reloads"] += 1
+            if entry["on_reload"]:
+                entry["on_reload"](name, model)
+        print(f"✅ Model '{name}' {'reloaded' if replaced else 'loaded'}")
@@ -1,31 +1,167 @@
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+
+from db_config import bind_key, foreign_key
 
 db = SQLAlchemy()
 
+
+# ----------------- DATABASE MODELS -----------------
+# Each model lives in its own SQLite bind (see db_config.py). With
+# DATABASE_URL set they all share one database and the id references on
+# ServiceOrder become real foreign keys.
+class User(db.Model):
+    __bind_key__ = bind_key('orders')
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(100), unique=True, nullable=False)   # unique => indexed
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+
+
 class Product(db.Model):
+    __bind_key__ = bind_key('products')
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(100), nullable=False, index=True)
+    price = db.Column(db.Float, nullable=False, index=True)
+    description = db.Column(db.String(200))
+    image = db.Column(db.String(200))
+    image_variants = db.Column(db.String(50))   # widths with generated variants, e.g. "320,640"
+    price_range = db.Column(db.String(50), index=True)
+
+    __table_args__ = (
+        # Keyset pagination when the catalog is sorted by price
+        db.Index("ix_product_price_id", "price", "id"),
+        # Covers the facet counts' GROUP BY (category, price_range)
+        db.Index("ix_product_category_price_range", "category", "price_range"),
+    )
+
+
+class ServiceOrder(db.Model):
+    __bind_key__ = bind_key('services')
+    id = db.Column(db.Integer, primary_key=True)
+
+    # User/service details
+    name = db.Column(db.String(100), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    service_type = db.Column(db.String(100), nullable=False, index=True)
+    date = db.Column(db.String(50), nullable=False, index=True)
+    address = db.Column(db.String(200), nullable=False)
+    service_date = db.Column(db.Date, index=True)   # parsed from `date` for analytics
+
+    # Product details (copied from products.db at install time)
+    product_name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    image = db.Column(db.String(200), nullable=False)
-    price_range = db.Column(db.String(50), nullable=False)
 
-class User(db.Model):
+    # References to the ordered product and the logged-in customer
+    product_id = db.Column(db.Integer, *foreign_key("product.id", ondelete="SET NULL"), index=True)
+    user_id = db.Column(db.Integer, *foreign_key("user.id", ondelete="SET NULL"), index=True)
+
+
+class ContactMessage(db.Model):
+    __bind_key__ = bind_key("order")
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    sentiment = db.Column(db.String(20), nullable=False, index=True)  # positive/negative/neutral/pending
+    sentiment_score = db.Column(db.Float)  # model confidence for `sentiment`
+    label = db.Column(db.String(20), index=True)   # admin-confirmed sentiment, used for retraining
+    trained_label = db.Column(db.String(20))        # `label` as last fed to the sentiment model
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)   # NULL for legacy rows
+
+
+# Daily/weekly/monthly service totals, built incrementally from ServiceOrder
+class ServiceRollup(db.Model):
+    __bind_key__ = bind_key('services')
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)     # day / week / month
+    bucket = db.Column(db.Date, nullable=False)           # first day of the period
+    service_type = db.Column(db.String(100), nullable=False)
+    product_name = db.Column(db.String(100), nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("period", "bucket", "service_type", "product_name",
+                            name="uq_service_rollup_key"),
+    )
+
+
+# Technician capacity per day and service type. Bookings reserve a place
+# with a conditional UPDATE (booked < capacity); see reserve_slot in app.py.
+class ServiceSlot(db.Model):
+    __bind_key__ = bind_key('services')
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(100), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
+    service_type = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    booked = db.Column(db.Integer, nullable=False, default=0)
 
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+    __table_args__ = (
+        # (service_type, day) first: availability is a range scan over days
+        db.UniqueConstraint("service_type", "day", name="uq_service_slot_key"),
+    )
 
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
 
-class Order(db.Model):
+# Hourly/daily message counts per sentiment, kept in step as messages are
+# classified, re-scored and deleted (see bump_sentiment_trends in app.py)
+class SentimentRollup(db.Model):
+    __bind_key__ = bind_key("order")
     id = db.Column(db.Integer, primary_key=True)
-    customer_name = db.Column(db.String(100), nullable=False)
-    date = db.Column(db.DateTime, nullable=False)
-    total = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(50), default="Pending")
+    period = db.Column(db.String(10), nullable=False)     # hour / day
+    bucket = db.Column(db.DateTime, nullable=False)       # start of the hour / day
+    sentiment = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("period", "bucket", "sentiment", name="uq_sentiment_rollup_key"),
+    )
+
+
+# ----------------- DASHBOARD COUNTERS -----------------
+# Running totals for the admin dashboard. Each counter lives in the same
+# database as the rows it counts (maintained by the mapper events in app.py).
+class CategoryCount(db.Model):
+    __bind_key__ = bind_key('products')
+    category = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CatalogMeta(db.Model):
+    __bind_key__ = bind_key('products')
+    key = db.Column(db.String(50), primary_key=True)   # "version"
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ServiceStat(db.Model):
+    __bind_key__ = bind_key('services')
+    key = db.Column(db.String(50), primary_key=True)   # "orders" / "revenue" / rollup watermark
+    value = db.Column(db.Float, nullable=False, default=0)
+
+
+# ----------------- RECOMMENDATIONS -----------------
+# Top-k neighbour table built offline by `flask refresh-recommendations`
+# (see recommend.py); a product's suggestions are one primary-key range scan.
+class ProductNeighbor(db.Model):
+    __bind_key__ = bind_key('products')
+    product_id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)      # similar / together
+    rank = db.Column(db.Integer, primary_key=True)
+    neighbor_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+
+# Products edited or deleted since the last refresh (new ones are found by id)
+class RecommendationDirty(db.Model):
+    __bind_key__ = bind_key('products')
+    product_id = db.Column(db.Integer, primary_key=True)
+
+
+# Which products each customer (phone, or name) has had serviced, kept up to
+# date from new orders so "serviced together" never rescans the order history
+class CustomerProduct(db.Model):
+    __bind_key__ = bind_key('services')
+    customer = db.Column(db.String(120), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, index=True)
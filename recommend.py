@@ -0,0 +1,112 @@
+"""Offline neighbour computation for the product recommendations in app.py.
+
+- similar: cosine similarity of TF-IDF vectors over each product's name,
+  category and description.
+- together: products serviced by the same customers (orders grouped by
+  phone, or by name when there is no phone), scored by the cosine of the
+  two products' customer sets: shared / sqrt(customers_a * customers_b).
+
+Both return {product_id: [(neighbor_id, score), ...]} with the best k
+first, for only the products asked for, so a refresh can recompute just
+the rows whose inputs changed. The results are stored in the
+ProductNeighbor table and served from there.
+"""
+from collections import Counter, defaultdict
+from math import sqrt
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+SIMILAR_CHUNK = 256     # target rows per dense (products x chunk) similarity block
+
+
+def product_text(name, category, description):
+    # Category twice: it is the strongest signal and usually a single word
+    return " ".join(filter(None, [name, category, category, description]))
+
+
+def product_vectors(texts):
+    """L2-normalized TF-IDF rows, one per product text."""
+    if not texts:
+        return None
+    vectorizer = TfidfVectorizer(sublinear_tf=True, stop_words="english", dtype=np.float32)
+    try:
+        return vectorizer.fit_transform(texts).tocsr()
+    except ValueError:      # only stop words / empty texts
+        return None
+
+
+def similar_products(ids, matrix, targets, k):
+    """Top-k most similar products for each id in `targets`.
+
+    `ids` are the product ids in the row order of `matrix` (product_vectors).
+    """
+    if matrix is None:
+        return {t: [] for t in targets}
+    position = {pid: i for i, pid in enumerate(ids)}
+    rows = [position[t] for t in targets if t in position]
+    k = min(k, len(ids) - 1)
+    if k <= 0:
+        return {ids[r]: [] for r in rows}
+    # Extra candidates so near-ties at the cut are settled by rounded score,
+    # then lowest id, and a refresh is deterministic
+    candidates = min(2 * k, len(ids) - 1)
+    neighbors = {}
+    for start in range(0, len(rows), SIMILAR_CHUNK):
+        chunk = rows[start:start + SIMILAR_CHUNK]
+        # (products x chunk) with a dense right-hand side is far cheaper than
+        # a sparse x sparse product whose result is mostly non-zero anyway
+        sims = (matrix @ matrix[chunk].T.toarray()).T
+        sims[np.arange(len(chunk)), chunk] = -1.0     # never recommend the product itself
+        top = np.argpartition(-sims, candidates - 1, axis=1)[:, :candidates]
+        for offset, row_index in enumerate(chunk):
+            scored = sorted(
+                ((round(float(sims[offset, c]), 4), ids[c]) for c in top[offset] if sims[offset, c] > 0),
+                key=lambda pair: (-pair[0], pair[1]),
+            )
+            neighbors[ids[row_index]] = [(pid, score) for score, pid in scored[:k]]
+    return neighbors
+
+
+def similarity_to(ids, matrix, sources):
+    """{product_id: best similarity to any of `sources`} for every product."""
+    position = {pid: i for i, pid in enumerate(ids)}
+    rows = [position[s] for s in sources if s in position]
+    if matrix is None or not rows:
+        return {}
+    best = (matrix @ matrix[rows].T).max(axis=1).toarray().ravel()
+    return {pid: float(best[i]) for i, pid in enumerate(ids) if pid not in sources}
+
+
+def customer_key(phone, name):
+    return (phone or "").strip() or (name or "").strip().lower()
+
+
+def serviced_together(baskets, targets, k, customer_counts=None):
+    """Top-k products most often serviced by the same customers as each target.
+
+    `baskets` must hold every customer of every target. When it holds only
+    those, pass `customer_counts` ({product_id: customers}) for the other
+    products in their baskets.
+    """
+    customers_of = defaultdict(list)
+    for customer, products in baskets.items():
+        for pid in products:
+            customers_of[pid].append(customer)
+    if customer_counts is None:
+        customer_counts = {pid: len(customers) for pid, customers in customers_of.items()}
+
+    neighbors = {}
+    for target in targets:
+        counts = Counter()
+        for customer in customers_of.get(target, ()):
+            counts.update(baskets[customer])
+        counts.pop(target, None)
+        n_target = len(customers_of.get(target, ()))
+        scored = [
+            (pid, round(shared / sqrt(n_target * customer_counts[pid]), 4))
+            for pid, shared in counts.items()
+        ]
+        scored.sort(key=lambda pair: (-pair[1], pair[0]))
+        neighbors[target] = scored[:k]
+    return neighbors
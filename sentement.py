@@ -60,41 +60,24 @@ with open("data/admin_sentiment_keywords_large.json", "w") as f:
 
 print("Generated 200+ admin messages with keywords and saved as admin_sentiment_keywords_large.json")
 
-import json
-import random
-import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.pipeline import Pipeline
-
-# --- 1. Generate or load dataset ---
-# For simplicity, we will use the large dataset you generated earlier
-with open("data/admin_sentiment_keywords_large.json", "r") as f:
-    data = json.load(f)
-
-# Combine message + keywords for better prediction
-X = [item['message'] + " " + " ".join(item['keywords']) for item in data]
-y = [item['sentiment'] for item in data]
+from joblib import load
+from training import train_sentiment, seed_sentiment_data, LIVE_PATHS
 
-# --- 2. Create vectorizer and transform X ---
-vectorizer = TfidfVectorizer()
-X_vect = vectorizer.fit_transform(X)
+# --- 1. Load the dataset generated above ---
+X, y = seed_sentiment_data()
 
-# --- 3. Train Naive Bayes classifier ---
-nb_model = MultinomialNB()
-nb_model.fit(X_vect, y)
+# --- 2. Train hashing vectorizer + Naive Bayes, version and publish them ---
+# (models/vectorizer.pkl and models/naive_bayes_model.pkl, see training.py)
+run = train_sentiment(X, y)
 
-# --- 4. Save the model and vectorizer ---
-with open("models/naive_bayes_model.pkl", "wb") as f:
-    pickle.dump(nb_model, f)
-
-with open("models/vectorizer.pkl", "wb") as f:
-    pickle.dump(vectorizer, f)
-
-print("Naive Bayes model saved as naive_bayes_model.pkl")
+print(f"Naive Bayes model saved as naive_bayes_model.pkl (v{run['version']}, "
+      f"holdout accuracy {run['accuracy']}, {run['train_seconds']}s)")
 print("Vectorizer saved as vectorizer.pkl")
 
-# --- 5. Optional: Test prediction ---
+# --- 3. Optional: Test prediction ---
+vectorizer = load(LIVE_PATHS["vectorizer"])
+nb_model = load(LIVE_PATHS["naive_bayes_model"])
+
 test_msgs = [
     "I am very happy with the progress!",
     "The project is falling behind schedule.",
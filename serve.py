@@ -0,0 +1,70 @@
+"""Production launcher (use instead of `python app.py`, which is the debug server).
+
+    python serve.py                         # gunicorn, threaded WSGI workers
+    python serve.py --asgi                  # uvicorn + asgi.py (async chat endpoints)
+    WEB_WORKERS=8 python serve.py --port 8080
+
+Defaults come from HOST, PORT, WEB_WORKERS and WEB_THREADS. Workers are
+separate processes, each with its own background queues and model cache;
+the app is imported in every worker (no --preload) so those threads are
+started after the fork, when the worker boots (gunicorn's post_worker_init
+hook below, or the ASGI lifespan). One worker also re-queues contact
+messages left pending by a previous run.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+
+# gunicorn hook: this module doubles as its config file (--config python:serve)
+def post_worker_init(worker):
+    import app as shop
+    shop.start_background_workers()
+    shop.requeue_pending_messages()
+
+
+def default_workers():
+    return int(os.environ.get("WEB_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+
+
+def command(args):
+    bind = f"{args.host}:{args.port}"
+    if args.asgi:
+        return "uvicorn", [
+            "-m", "uvicorn", "asgi:application",
+            "--host", args.host, "--port", str(args.port),
+            "--workers", str(args.workers), "--lifespan", "on",
+            "--timeout-keep-alive", "30",
+        ]
+    return "gunicorn", [
+        "-m", "gunicorn", "app:app",
+        "--config", "python:serve",
+        "--bind", bind,
+        "--workers", str(args.workers),
+        "--worker-class", "gthread", "--threads", str(args.threads),
+        "--timeout", str(args.timeout),
+        "--access-logfile", "-",
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers(), help="worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("WEB_THREADS", 8)),
+                        help="request threads per WSGI worker")
+    parser.add_argument("--timeout", type=int, default=60, help="WSGI worker timeout (s)")
+    parser.add_argument("--asgi", action="store_true", help="serve asgi:application with uvicorn")
+    args = parser.parse_args(argv)
+
+    server, server_args = command(args)
+    if importlib.util.find_spec(server) is None:
+        sys.exit(f"❌ {server} is not installed (pip install {server})")
+    print(f"🚀 Starting {server} on {args.host}:{args.port} with {args.workers} workers")
+    os.execv(sys.executable, [sys.executable, *server_args])
+
+
+if __name__ == "__main__":
+    main()
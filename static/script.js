@@ -28,17 +28,51 @@ function addMessage(message, sender) {
     msgDiv.innerText = message;
     chatMessages.appendChild(msgDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight; // auto-scroll
+    return msgDiv;
 }
 
-// Send message
-sendBtn.addEventListener("click", () => {
-    const userMessage = chatInput.value.trim();
-    if (!userMessage) return;
+// Fill the placeholder left under a question with its answer
+function showReply(slot, answer) {
+    slot.innerText = answer;
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+}
 
-    addMessage(userMessage, "user"); // user message
-    chatInput.value = "";
+// Chat channel: one WebSocket per page (served by asgi.py); falls back to
+// a POST per message when the socket is unavailable (e.g. plain WSGI server)
+let chatSocket = null;
+let socketFailed = false;
+// Socket replies arrive in whatever order their batches finish; each one
+// carries the id of its question and goes into that question's slot
+const pendingReplies = new Map();
 
-    // Send to backend
+function openChatSocket() {
+    if (socketFailed || !("WebSocket" in window)) return null;
+    if (chatSocket && chatSocket.readyState <= WebSocket.OPEN) return chatSocket;
+
+    const scheme = location.protocol === "https:" ? "wss" : "ws";
+    const socket = new WebSocket(`${scheme}://${location.host}/ws/chat`);
+    socket.addEventListener("message", (event) => {
+        const data = JSON.parse(event.data);
+        const slot = pendingReplies.get(data.id);
+        if (!slot) return;
+        pendingReplies.delete(data.id);
+        showReply(slot, data.answer);
+    });
+    socket.addEventListener("close", () => {
+        // Never opened: this server has no socket endpoint
+        if (!socket.opened) socketFailed = true;
+        chatSocket = null;
+        if (!socket.opened) return;   // askBot re-asks those over HTTP
+        // Dropped mid-conversation: these answers will not come
+        for (const slot of pendingReplies.values()) showReply(slot, "Error connecting to server.");
+        pendingReplies.clear();
+    });
+    socket.addEventListener("open", () => { socket.opened = true; });
+    chatSocket = socket;
+    return socket;
+}
+
+function askOverHttp(userMessage, slot) {
     fetch("/get_answer", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
@@ -46,12 +80,49 @@ sendBtn.addEventListener("click", () => {
     })
     .then(res => res.json())
     .then(data => {
-        addMessage(data.answer, "bot"); // bot reply
+        showReply(slot, data.answer); // bot reply
     })
     .catch(err => {
-        addMessage("Error connecting to server.", "bot");
+        showReply(slot, "Error connecting to server.");
         console.error(err);
     });
+}
+
+let chatMessageId = 0;
+
+function askBot(userMessage, slot) {
+    const socket = openChatSocket();
+    if (!socket) return askOverHttp(userMessage, slot);
+
+    const id = ++chatMessageId;
+    pendingReplies.set(id, slot);
+    const payload = JSON.stringify({ id: id, message: userMessage });
+    if (socket.readyState === WebSocket.OPEN) {
+        socket.send(payload);
+        return;
+    }
+    // Still connecting: send once open, or fall back if it never opens
+    socket.addEventListener("open", () => socket.send(payload), { once: true });
+    socket.addEventListener("close", () => {
+        if (socket.opened) return;
+        pendingReplies.delete(id);
+        askOverHttp(userMessage, slot);
+    }, { once: true });
+}
+
+// Connect when the chat window is first opened
+chatbotIcon.addEventListener("click", openChatSocket, { once: true });
+
+// Send message
+sendBtn.addEventListener("click", () => {
+    const userMessage = chatInput.value.trim();
+    if (!userMessage) return;
+
+    addMessage(userMessage, "user"); // user message
+    chatInput.value = "";
+
+    // Placeholder right under the question, filled when its answer arrives
+    askBot(userMessage, addMessage("...", "bot"));
 });
 
 // Optional: send message on Enter key
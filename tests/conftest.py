@@ -0,0 +1,26 @@
+"""Shared setup: every bind points at SQLite files in a temporary directory.
+
+The environment has to be in place before app.py (or db_config.py) is
+imported, since both read it at import time.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)   # app.py loads models/ and data/ relative to the working directory
+
+DB_DIR = tempfile.mkdtemp(prefix="shop-tests-")
+for key, filename in (("ORDERS", "user.db"), ("PRODUCTS", "products.db"),
+                      ("SERVICES", "services.db"), ("ORDER", "order.db")):
+    os.environ[f"DATABASE_URL_{key}"] = f"sqlite:///{os.path.join(DB_DIR, filename)}"
+os.environ.pop("DATABASE_URL", None)
+
+
+@pytest.fixture(scope="session")
+def shop():
+    import app
+    return app
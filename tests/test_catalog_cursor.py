@@ -0,0 +1,40 @@
+import pytest
+
+
+@pytest.fixture
+def client(shop):
+    return shop.app.test_client()
+
+
+@pytest.mark.parametrize("sort, values", [
+    ("id", [7]),
+    ("price_asc", [1999.5, 7]),
+    ("price_desc", [2000, 7]),      # an int is a valid float key
+])
+def test_valid_cursor_is_accepted(shop, client, sort, values):
+    response = client.get("/api/products", query_string={"sort": sort, "cursor": shop.encode_cursor(values)})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("sort, values", [
+    ("id", [{"a": 1}]),
+    ("id", [[1]]),
+    ("id", [True]),
+    ("id", ["7"]),
+    ("id", [1.5]),
+    ("id", [7, 8]),
+    ("id", []),
+    ("id", {"id": 7}),
+    ("price_asc", [10.0]),
+    ("price_asc", [10.0, "x"]),
+    ("price_asc", [None, 7]),
+])
+def test_tampered_cursor_is_rejected(shop, client, sort, values):
+    response = client.get("/api/products", query_string={"sort": sort, "cursor": shop.encode_cursor(values)})
+    assert response.status_code == 400
+    assert "cursor" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "e30", "bm90IGpzb24"])   # not base64, {}, "not json"
+def test_undecodable_cursor_is_rejected(client, cursor):
+    assert client.get("/api/products", query_string={"cursor": cursor}).status_code == 400
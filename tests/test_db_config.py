@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import ForeignKey, create_engine, text
+
+import db_config
+
+
+def test_bind_url_defaults_and_overrides():
+    assert db_config.bind_url("products", {}) == "sqlite:///products.db"
+    env = {"DATABASE_URL_PRODUCTS": "postgresql://shop@db/shop"}
+    assert db_config.bind_url("products", env) == "postgresql://shop@db/shop"
+    assert db_config.bind_url("services", env) == "sqlite:///services.db"
+
+
+def test_pool_settings_per_bind_override_global():
+    env = {"DB_POOL_SIZE": "7", "DB_POOL_SIZE_SERVICES": "20", "DB_POOL_TIMEOUT": "2.5"}
+    services = db_config.engine_options("services", env)
+    products = db_config.engine_options("products", env)
+    assert services["pool_size"] == 20
+    assert products["pool_size"] == 7
+    assert products["max_overflow"] == 10
+    assert products["pool_timeout"] == 2.5
+
+
+def test_sqlite_options_follow_busy_timeout():
+    options = db_config.engine_options("orders", {"SQLITE_BUSY_TIMEOUT_ORDERS": "1500"})
+    assert options["connect_args"] == {"timeout": 1.5, "check_same_thread": False}
+    assert "pool_pre_ping" not in options
+
+
+def test_server_database_gets_pre_ping_and_recycle():
+    env = {"DATABASE_URL_PRODUCTS": "postgresql://shop@db/shop", "DB_POOL_RECYCLE": "600"}
+    options = db_config.engine_options("products", env)
+    assert options["pool_pre_ping"] is True
+    assert options["pool_recycle"] == 600
+    assert "connect_args" not in options
+
+
+def test_pragma_overrides_are_applied_on_connect(tmp_path):
+    env = {"SQLITE_CACHE_SIZE": "-2048", "SQLITE_CACHE_SIZE_PRODUCTS": "-4096",
+           "SQLITE_SYNCHRONOUS": "FULL"}
+    assert db_config.sqlite_pragmas("products", env)["cache_size"] == "-4096"
+    assert db_config.sqlite_pragmas("orders", env)["cache_size"] == "-2048"
+
+    options = db_config.engine_options("products", {"DATABASE_URL_PRODUCTS": f"sqlite:///{tmp_path / 'p.db'}"})
+    engine = create_engine(options.pop("url"), **options)
+    db_config.configure_engine("products", engine, env)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -4096
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 2   # FULL
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+    engine.dispose()
+
+
+def test_non_sqlite_engines_are_left_alone():
+    engine = create_engine("sqlite://")
+    # Only the dialect name is checked, so a stand-in with another name will do
+    engine.dialect.name = "postgresql"
+    db_config.configure_engine("products", engine, {})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "memory"
+
+
+@pytest.fixture
+def consolidated(monkeypatch, tmp_path):
+    url = f"sqlite:///{tmp_path / 'shop.db'}"
+    monkeypatch.setattr(db_config, "CONSOLIDATED_URL", url)
+    return url
+
+
+def test_consolidated_mode_uses_one_database(consolidated):
+    assert db_config.bind_key("products") is None
+    options = db_config.engine_options(None, {"DATABASE_URL": consolidated, "DB_POOL_SIZE": "3"})
+    assert options["url"] == consolidated
+    assert options["pool_size"] == 3
+
+    foreign_keys = db_config.foreign_key("product.id", ondelete="SET NULL")
+    assert len(foreign_keys) == 1 and isinstance(foreign_keys[0], ForeignKey)
+
+
+def test_separate_binds_have_no_foreign_keys():
+    assert db_config.CONSOLIDATED_URL is None
+    assert db_config.bind_key("products") == "products"
+    assert db_config.foreign_key("product.id") == []
+
+
+def test_consolidated_pragmas_use_global_settings(consolidated, tmp_path):
+    engine = create_engine(consolidated)
+    db_config.configure_engine(None, engine, {"SQLITE_BUSY_TIMEOUT": "1234"})
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    engine.dispose()
+    assert sqlite3.connect(tmp_path / "shop.db").execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_app_starts_on_a_consolidated_database(tmp_path):
+    # DATABASE_URL is read at import time, so this needs a fresh interpreter
+    script = (
+        "import app\n"
+        "with app.app.app_context():\n"
+        "    assert list(app.db.engines) == [None], list(app.db.engines)\n"
+        "    assert app.ServiceOrder.__table__.c.product_id.foreign_keys\n"
+        "    print(app.Product.query.count())\n"
+    )
+    env = {k: v for k, v in os.environ.items() if not k.startswith("DATABASE_URL")}
+    env["DATABASE_URL"] = f"sqlite:///{tmp_path / 'shop.db'}"
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "0"
+    tables = {name for (name,) in sqlite3.connect(tmp_path / "shop.db").execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"product", "service_order", "user", "contact_message"} <= tables
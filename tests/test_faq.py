@@ -0,0 +1,51 @@
+import json
+import random
+
+import pytest
+
+from faq import KeywordMatcher
+
+
+def nested_loop(faqs, text):
+    """The keyword fallback KeywordMatcher replaced."""
+    for index, faq in enumerate(faqs):
+        for keyword in faq["keywords"]:
+            if keyword.lower() in text:
+                return index
+    return None
+
+
+@pytest.fixture(scope="module")
+def faqs():
+    with open("data/chat.json") as f:
+        return json.load(f)["faq"]
+
+
+def test_matches_nested_loop_on_faq_data(faqs):
+    matcher = KeywordMatcher(faqs)
+    keywords = [k.lower() for faq in faqs for k in faq["keywords"]]
+    rng = random.Random(7)
+    words = " ".join(keywords).split() + ["hello", "please", "xyz", "the", "price", "?"]
+
+    texts = list(keywords)
+    texts += [" ".join(rng.choices(words, k=rng.randint(1, 8))) for _ in range(2000)]
+    # Keywords glued into other text, so matches start mid-word
+    texts += [rng.choice(keywords) + rng.choice(keywords) for _ in range(500)]
+    texts += ["", "   ", "zzzz", "qwerty uiop"]
+
+    for text in texts:
+        assert matcher.find(text) == nested_loop(faqs, text), text
+
+
+def test_overlapping_keywords_prefer_the_earliest_faq():
+    faqs = [{"keywords": ["cart"]}, {"keywords": ["art", "smart"]}, {"keywords": ["ar"]}]
+    matcher = KeywordMatcher(faqs)
+    for text in ["smart", "a smart cart", "art", "car", "bar", "smar", "cartoon", "dart"]:
+        assert matcher.find(text) == nested_loop(faqs, text), text
+
+
+def test_empty_keywords_are_ignored():
+    # Unlike the old loop, where "" matched every input
+    faqs = [{"keywords": [""]}, {"keywords": ["fan"]}]
+    assert KeywordMatcher(faqs).find("ceiling fan") == 1
+    assert KeywordMatcher(faqs).find("light") is None
@@ -0,0 +1,63 @@
+import itertools
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+# Each test books its own far-future day
+_days = itertools.count(1000)
+
+
+@pytest.fixture
+def booking(shop):
+    """Values for an order on a fresh day with room for three bookings."""
+    day = date.today() + timedelta(days=next(_days))
+    with shop.app.app_context():
+        shop.create_slot(day, "Repair", capacity=3)
+    return dict(name="Asha", phone="9000000000", service_type="Repair", date=day.isoformat(),
+                service_date=day, address="1 Main Road", product_name="Fan", price=500.0)
+
+
+def book(shop, values):
+    with shop.app.app_context():
+        return shop.save_service_order(dict(values))
+
+
+def slot_state(shop, values):
+    with shop.app.app_context():
+        slot = shop.ServiceSlot.query.filter_by(day=values["service_date"], service_type="Repair").one()
+        orders = shop.ServiceOrder.query.filter_by(service_date=values["service_date"]).count()
+        return slot.booked, orders
+
+
+def test_full_slot_rejects_booking(shop, booking):
+    assert all(book(shop, booking) is not None for _ in range(3))
+    assert book(shop, booking) is None
+    assert slot_state(shop, booking) == (3, 3)
+
+
+def test_concurrent_bookings_never_overbook(shop, booking):
+    results = []
+    start = threading.Barrier(12)
+
+    def attempt():
+        start.wait()
+        results.append(book(shop, booking))
+
+    threads = [threading.Thread(target=attempt) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(r is not None for r in results) == 3
+    assert slot_state(shop, booking) == (3, 3)
+
+
+def test_deleted_order_frees_its_place(shop, booking):
+    ids = [book(shop, booking) for _ in range(3)]
+    with shop.app.app_context():
+        shop.db.session.delete(shop.db.session.get(shop.ServiceOrder, ids[0]))
+        shop.db.session.commit()
+    assert book(shop, booking) is not None
+    assert slot_state(shop, booking) == (3, 3)
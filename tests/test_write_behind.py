@@ -0,0 +1,82 @@
+import threading
+from datetime import date, timedelta
+
+from workers import Ticket
+
+
+def test_cancel_before_claim_wins():
+    ticket = Ticket()
+    assert ticket.cancel()
+    assert not ticket.claim()
+    assert not ticket.cancel()
+
+
+def test_claim_before_cancel_wins():
+    ticket = Ticket()
+    assert ticket.claim()
+    assert not ticket.cancel()
+
+
+def test_claim_and_cancel_race_has_one_winner():
+    for _ in range(200):
+        ticket = Ticket()
+        start = threading.Barrier(2)
+        outcome = {}
+
+        def run(name, action):
+            start.wait()
+            outcome[name] = action()
+
+        threads = [threading.Thread(target=run, args=("claim", ticket.claim)),
+                   threading.Thread(target=run, args=("cancel", ticket.cancel))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert outcome["claim"] != outcome["cancel"]
+
+
+def booking_values(day_offset):
+    day = date.today() + timedelta(days=day_offset)
+    return dict(name="Ravi", phone="9111111111", service_type="Installation", date=day.isoformat(),
+                service_date=day, address="2 Lake View", product_name="Heater", price=900.0,
+                product_id=None, user_id=None)
+
+
+def count_orders(shop, values):
+    with shop.app.app_context():
+        return shop.ServiceOrder.query.filter_by(service_date=values["service_date"],
+                                                 service_type="Installation").count()
+
+
+def test_writer_skips_cancelled_items(shop):
+    values = booking_values(2000)
+    cancelled, live = Ticket(), Ticket()
+    assert cancelled.cancel()
+
+    shop.write_batch([("service", dict(values), cancelled), ("service", dict(values), live)])
+
+    assert live.wait(0) and live.error is None and live.result is not None
+    assert count_orders(shop, values) == 1
+
+
+def test_await_write_cancels_a_ticket_still_queued(shop, monkeypatch):
+    monkeypatch.setattr(shop, "WRITE_BEHIND_ACK_TIMEOUT", 0.01)
+    ticket = Ticket()
+    assert shop.await_write(ticket) == "cancelled"
+    assert not ticket.claim()
+
+
+def test_await_write_reports_a_claimed_ticket_as_pending(shop, monkeypatch):
+    monkeypatch.setattr(shop, "WRITE_BEHIND_ACK_TIMEOUT", 0.01)
+    ticket = Ticket()
+    ticket.claim()
+    assert shop.await_write(ticket) == "pending"
+
+
+def test_await_write_outcomes(shop):
+    done, failed = Ticket(), Ticket()
+    done.resolve(42)
+    failed.resolve(error=RuntimeError("boom"))
+    assert shop.await_write(done) == "done"
+    assert shop.await_write(failed) == "failed"
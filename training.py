@@ -0,0 +1,264 @@
+"""Training pipeline for the FAQ chatbot and the contact-message sentiment model.
+
+- FAQ: TF-IDF + LogisticRegression over the keywords in data/chat.json,
+  refit from scratch (the dataset is small and fits in a second).
+- FAQ index: character n-gram vectors of every FAQ phrasing for
+  similarity retrieval (faq.FaqIndex); rebuilt incrementally, re-vectorizing
+  only the entries of chat.json that changed.
+- Sentiment: HashingVectorizer + MultinomialNB. The hashing vectorizer is
+  stateless, so new labelled messages can be folded into the existing model
+  with `partial_fit` instead of rebuilding the vocabulary and refitting.
+
+Artifacts are written as versioned files (e.g. models/faq_model-v3.pkl) and
+then atomically swapped into the live path the app loads from, so the model
+registry in app.py never reads a half-written file. Every run is recorded
+in models/manifest.json with its train time, sample count and accuracy.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from joblib import dump, load
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+
+from faq import FaqIndex
+from fsutil import FILE_MODE
+
+MODELS_DIR = "models"
+MANIFEST_PATH = os.path.join(MODELS_DIR, "manifest.json")
+FAQ_DATA_PATH = os.path.join("data", "chat.json")
+SENTIMENT_DATA_PATH = os.path.join("data", "admin_sentiment_keywords_large.json")
+
+LIVE_PATHS = {
+    "faq_model": os.path.join(MODELS_DIR, "faq_model.pkl"),
+    "faq_index": os.path.join(MODELS_DIR, "faq_index.pkl"),
+    "vectorizer": os.path.join(MODELS_DIR, "vectorizer.pkl"),
+    "naive_bayes_model": os.path.join(MODELS_DIR, "naive_bayes_model.pkl"),
+}
+KEEP_VERSIONS = 5
+SENTIMENT_CLASSES = ["negative", "neutral", "positive"]
+
+
+# ---------- artifacts & manifest ----------
+def atomic_dump(obj, path):
+    """joblib.dump to a temp file in the same directory, then os.replace."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        dump(obj, tmp)
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"runs": []}
+
+
+def save_manifest(manifest):
+    fd, tmp = tempfile.mkstemp(dir=MODELS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.chmod(tmp, FILE_MODE)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def next_version(manifest, name):
+    versions = [run["version"] for run in manifest["runs"] if run["model"] == name]
+    return max(versions, default=0) + 1
+
+
+def publish(name, obj, version):
+    """Write models/<name>-v<version>.pkl and swap it into the live path."""
+    versioned = os.path.join(MODELS_DIR, f"{name}-v{version}.pkl")
+    atomic_dump(obj, versioned)
+
+    fd, tmp = tempfile.mkstemp(dir=MODELS_DIR, suffix=".tmp")
+    os.close(fd)
+    shutil.copyfile(versioned, tmp)
+    os.chmod(tmp, FILE_MODE)
+    os.replace(tmp, LIVE_PATHS[name])
+
+    # Keep the newest few versions for rollback
+    old = os.path.join(MODELS_DIR, f"{name}-v{version - KEEP_VERSIONS}.pkl")
+    if os.path.exists(old):
+        os.remove(old)
+    return versioned
+
+
+def record_run(manifest, name, version, mode, started, samples, accuracy):
+    run = {
+        "model": name,
+        "version": version,
+        "mode": mode,
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "train_seconds": round(time.perf_counter() - started, 3),
+        "samples": samples,
+        "accuracy": round(accuracy, 4) if accuracy is not None else None,
+    }
+    manifest["runs"].append(run)
+    return run
+
+
+# ---------- FAQ model ----------
+def faq_training_data(faqs):
+    X, y = [], []
+    for faq in faqs:
+        for keyword in faq["keywords"]:
+            X.append(keyword.lower())
+            y.append(faq["answer"])
+        # Natural sentence variations
+        X.append(f"how to reach {faq['keywords'][0]}")
+        y.append(faq["answer"])
+        X.append(f"tell me about {faq['keywords'][0]}")
+        y.append(faq["answer"])
+    return X, y
+
+
+def train_faq(faqs=None):
+    if faqs is None:
+        with open(FAQ_DATA_PATH) as f:
+            faqs = json.load(f)["faq"]
+
+    started = time.perf_counter()
+    X, y = faq_training_data(faqs)
+    model = Pipeline([
+        ('tfidf', TfidfVectorizer()),
+        ('clf', LogisticRegression(max_iter=200))
+    ])
+    model.fit(X, y)
+    # Most answers only have a handful of phrasings, so this is training accuracy
+    accuracy = model.score(X, y)
+
+    manifest = load_manifest()
+    version = next_version(manifest, "faq_model")
+    publish("faq_model", model, version)
+    run = record_run(manifest, "faq_model", version, "full", started, len(X), accuracy)
+    save_manifest(manifest)
+    return run
+
+
+def build_faq_index(faqs=None, full=False):
+    """Rebuild models/faq_index.pkl, reusing rows of unchanged entries unless `full`."""
+    if faqs is None:
+        with open(FAQ_DATA_PATH) as f:
+            faqs = json.load(f)["faq"]
+
+    started = time.perf_counter()
+    previous = None
+    if not full:
+        try:
+            previous = load(LIVE_PATHS["faq_index"])
+        except (OSError, ValueError):
+            pass
+        if not isinstance(previous, FaqIndex):
+            previous = None
+    index, vectorized = FaqIndex.build(faqs, previous)
+
+    # Share of keywords whose own entry's answer comes back first
+    queries, expected = [], []
+    for entry in faqs:
+        for keyword in entry.get("keywords", []):
+            queries.append(keyword)
+            expected.append(entry["answer"])
+    hits = sum(index.answers[top[0][0]] == answer
+               for top, answer in zip(index.search_many(queries), expected) if top)
+    accuracy = hits / len(queries) if queries else None
+
+    manifest = load_manifest()
+    version = next_version(manifest, "faq_index")
+    publish("faq_index", index, version)
+    mode = "incremental" if previous is not None else "full"
+    run = record_run(manifest, "faq_index", version, mode, started, vectorized, accuracy)
+    save_manifest(manifest)
+    return run
+
+
+# ---------- sentiment model ----------
+def new_sentiment_vectorizer():
+    # Non-negative features, as MultinomialNB requires
+    return HashingVectorizer(n_features=2 ** 18, alternate_sign=False, norm="l2")
+
+
+def seed_sentiment_data(path=SENTIMENT_DATA_PATH):
+    with open(path) as f:
+        data = json.load(f)
+    # Combine message + keywords for better prediction
+    X = [item['message'] + " " + " ".join(item['keywords']) for item in data]
+    y = [item['sentiment'] for item in data]
+    return X, y
+
+
+def train_sentiment(texts=None, labels=None, test_size=0.2):
+    """Fit a fresh hashing + naive Bayes model (seed dataset by default)."""
+    if texts is None:
+        texts, labels = seed_sentiment_data()
+
+    started = time.perf_counter()
+    vectorizer = new_sentiment_vectorizer()
+    model = MultinomialNB()
+    X = vectorizer.transform(texts)
+
+    accuracy = None
+    if len(texts) >= 10:
+        X_train, X_test, y_train, y_test = train_test_split(X, labels, test_size=test_size, random_state=0)
+        model.partial_fit(X_train, y_train, classes=SENTIMENT_CLASSES)
+        accuracy = model.score(X_test, y_test)
+        model.partial_fit(X_test, y_test)
+    else:
+        model.partial_fit(X, labels, classes=SENTIMENT_CLASSES)
+
+    manifest = load_manifest()
+    return _publish_sentiment(manifest, vectorizer, model, "full", started, len(texts), accuracy)
+
+
+def update_sentiment(texts, labels):
+    """Fold newly labelled messages into the live sentiment model.
+
+    Accuracy is measured on the new batch *before* learning from it, so
+    every update reports how the previous model did on fresh feedback.
+    If the live model is not incremental (e.g. an older TF-IDF artifact),
+    it is first rebuilt from the seed dataset.
+    """
+    started = time.perf_counter()
+    manifest = load_manifest()
+    try:
+        vectorizer = load(LIVE_PATHS["vectorizer"])
+        model = load(LIVE_PATHS["naive_bayes_model"])
+    except (OSError, ValueError):
+        vectorizer = model = None
+    if not isinstance(vectorizer, HashingVectorizer) or not isinstance(model, MultinomialNB):
+        train_sentiment()
+        manifest = load_manifest()
+        vectorizer = load(LIVE_PATHS["vectorizer"])
+        model = load(LIVE_PATHS["naive_bayes_model"])
+
+    X = vectorizer.transform(texts)
+    accuracy = model.score(X, labels) if texts else None
+    if texts:
+        model.partial_fit(X, labels, classes=SENTIMENT_CLASSES)
+    return _publish_sentiment(manifest, vectorizer, model, "incremental", started, len(texts), accuracy)
+
+
+def _publish_sentiment(manifest, vectorizer, model, mode, started, samples, accuracy):
+    version = next_version(manifest, "naive_bayes_model")
+    # Vectorizer first: a hashing vectorizer is stateless, so the brief window
+    # where the app pairs it with the previous classifier is harmless
+    publish("vectorizer", vectorizer, version)
+    publish("naive_bayes_model", model, version)
+    run = record_run(manifest, "naive_bayes_model", version, mode, started, samples, accuracy)
+    save_manifest(manifest)
+    return run
@@ -0,0 +1,165 @@
+"""In-process background workers used by app.py.
+
+A BatchWorker owns a bounded queue and a few daemon threads that drain it
+in micro-batches: a thread blocks for the first item, then keeps collecting
+until it has `batch_size` items or `max_wait` seconds have passed, and hands
+the whole list to `handler` in one call.
+
+A Ticket travels with a queued item when the producer needs to know the
+outcome (e.g. that a row is committed) before it answers its request. A
+producer that gives up waiting can cancel() it; the handler claim()s each
+ticket before acting, so exactly one of the two wins.
+"""
+import queue
+import threading
+import time
+
+
+class Ticket:
+    """Completion handle for one queued item, resolved by the handler."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._state = "queued"
+        self.result = None
+        self.error = None
+
+    def claim(self):
+        """Called by the handler before acting on the item; False if it was cancelled."""
+        with self._lock:
+            if self._state == "cancelled":
+                return False
+            self._state = "claimed"
+            return True
+
+    def cancel(self):
+        """Withdraw the item; False when the handler has already claimed it."""
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "cancelled"
+            return True
+
+    def resolve(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """True once resolved; False if `timeout` passed first."""
+        return self._done.wait(timeout)
+
+
+class BatchWorker:
+    def __init__(self, name, handler, max_queue=1000, batch_size=32, max_wait=0.05, threads=1):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.thread_count = threads
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+        self.last_lag_ms = 0.0
+
+    # ---------- lifecycle ----------
+    def start(self):
+        if self._threads:
+            return self
+        self._stopping.clear()
+        for i in range(self.thread_count):
+            t = threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop accepting work and let the threads drain what is queued."""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(deadline - time.monotonic(), 0))
+        self._threads = []
+
+    # ---------- producers ----------
+    def submit(self, item, block=False, timeout=None):
+        """Queue one item. Returns False when the queue is full (backpressure)."""
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put((time.monotonic(), item), block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    # ---------- observability ----------
+    def stats(self):
+        with self._queue.mutex:
+            depth = len(self._queue.queue)
+            oldest = self._queue.queue[0][0] if depth else None
+        with self._lock:
+            return {
+                "running": any(t.is_alive() for t in self._threads),
+                "depth": depth,
+                "capacity": self._queue.maxsize,
+                "lag_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest else 0.0,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed,
+                "last_batch_size": self.last_batch_size,
+                "last_batch_ms": round(self.last_batch_ms, 1),
+                "last_lag_ms": round(self.last_lag_ms, 1),
+            }
+
+    # ---------- consumer ----------
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                self.handler([item for _, item in batch])
+                ok = True
+            except Exception as e:
+                print(f"❌ {self.name} worker failed on a batch of {len(batch)}:", e)
+                ok = False
+            finished = time.monotonic()
+            with self._lock:
+                if ok:
+                    self.processed += len(batch)
+                else:
+                    self.failed += len(batch)
+                self.last_batch_size = len(batch)
+                self.last_batch_ms = (finished - started) * 1000
+                self.last_lag_ms = (started - batch[0][0]) * 1000